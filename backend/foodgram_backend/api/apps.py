@@ -4,3 +4,39 @@ from django.apps import AppConfig
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.core.signals import request_started
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+
+        from rest_framework.authtoken.models import Token
+
+        from recipes.models import Ingredient, MeasurementUnit, Tag
+        from recipes.signals import reference_data_changed
+
+        from .authentication import token_deleted, user_saved
+        from .autocomplete import ingredient_index
+        from .connections import check_connections, connection_opened
+        from .exports import register_font
+        from .metrics import install_query_wrapper
+        from .reference_cache import invalidate_reference
+        from .replicas import check_pin_cache
+
+        check_pin_cache()
+        register_font()
+        request_started.connect(check_connections)
+        connection_created.connect(connection_opened)
+        connection_created.connect(install_query_wrapper)
+        post_delete.connect(token_deleted, sender=Token)
+        post_save.connect(user_saved, sender=get_user_model())
+        for model in (Tag, Ingredient, MeasurementUnit):
+            post_save.connect(invalidate_reference, sender=model)
+            post_delete.connect(invalidate_reference, sender=model)
+            reference_data_changed.connect(invalidate_reference, sender=model)
+        for model in (Ingredient, MeasurementUnit):
+            post_save.connect(ingredient_index.invalidate, sender=model)
+            post_delete.connect(ingredient_index.invalidate, sender=model)
+            reference_data_changed.connect(
+                ingredient_index.invalidate, sender=model)
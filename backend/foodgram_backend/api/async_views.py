@@ -0,0 +1,88 @@
+"""Асинхронные варианты представлений API для запуска под ASGI.
+
+Django 3.2 и DRF синхронные, и под ASGI Django выполняет синхронные
+представления по одному в общем потоке. Здесь представления оборачиваются
+в корутины, которые отдают обработку ограниченному пулу потоков: чтение
+идет параллельно, а рендеринг PDF, декодирование картинок и хэширование
+паролей выполняются в отдельном небольшом пуле и не занимают потоки чтения.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, update_wrapper
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.urls import URLPattern, URLResolver
+
+from asgiref.sync import sync_to_async
+
+from .connections import check_connections
+
+views_executor = ThreadPoolExecutor(
+    settings.ASGI_THREADS, thread_name_prefix='asgi-views')
+blocking_executor = ThreadPoolExecutor(
+    settings.ASGI_BLOCKING_THREADS, thread_name_prefix='asgi-blocking')
+
+BLOCKING = {
+    'recipes-list': ('POST',),
+    'recipes-detail': ('PUT', 'PATCH'),
+    'recipes-download-shopping-cart': ('GET',),
+    'user-list': ('POST',),
+    'user-set-password': ('POST',),
+    'login': ('POST',),
+}
+
+
+def call_view(view, request, *args, **kwargs):
+    """Выполняет представление в потоке пула и рендерит ответ там же.
+
+    Соединения с базой у потоков пула свои, поэтому они закрываются
+    по CONN_MAX_AGE и проверяются здесь, а не сигналами обработчика
+    запросов.
+    """
+
+    close_old_connections()
+    check_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def offload(view, blocking_methods=()):
+    """Корутина, которая выполняет view в пуле потоков.
+
+    Запросы с методами из blocking_methods идут в пул тяжелой работы.
+    """
+
+    handlers = {
+        blocking: sync_to_async(partial(call_view, view),
+                                thread_sensitive=False, executor=executor)
+        for blocking, executor in ((False, views_executor),
+                                   (True, blocking_executor))}
+
+    async def async_view(request, *args, **kwargs):
+        handler = handlers[request.method in blocking_methods]
+        return await handler(request, *args, **kwargs)
+
+    return update_wrapper(async_view, view)
+
+
+def offload_patterns(patterns):
+    """Копия маршрутов, в которой все представления асинхронные."""
+
+    result = []
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            result.append(URLResolver(
+                pattern.pattern, offload_patterns(pattern.url_patterns),
+                pattern.default_kwargs, pattern.app_name, pattern.namespace))
+        else:
+            result.append(URLPattern(
+                pattern.pattern,
+                offload(pattern.callback, BLOCKING.get(pattern.name, ())),
+                pattern.default_args, pattern.name))
+    return result
@@ -0,0 +1,115 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+SHARED_KEY = 'auth:token:{}'
+
+
+def shared_key(key):
+    """Ключ общего кэша: сам токен в именах ключей не хранится."""
+
+    return SHARED_KEY.format(hashlib.sha1(key.encode()).hexdigest())
+
+
+class TokenCache:
+    """Кэш токенов вместе с пользователями.
+
+    Первый уровень - LRU в памяти процесса на TOKEN_CACHE_SIZE записей,
+    второй (при TOKEN_CACHE_SHARED) - общий кэш Django. Записи живут
+    TOKEN_CACHE_TIMEOUT секунд, поэтому после сброса в одном процессе
+    другие процессы видят старую запись не дольше этого времени.
+
+    В общий кэш попадают только id пользователя и время создания токена:
+    пользователь с хэшем пароля и остальными полями хранится лишь в памяти
+    процесса и при промахе читается из базы по первичному ключу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            return entry[0]
+        if settings.TOKEN_CACHE_SHARED:
+            token = self.get_shared(key)
+            if token is not None:
+                self.remember(key, token)
+                return token
+        return None
+
+    def get_shared(self, key):
+        entry = cache.get(shared_key(key))
+        if not isinstance(entry, tuple):
+            # Нет записи или запись прежнего формата с пользователем.
+            return None
+        user_id, created = entry
+        user = User.objects.filter(pk=user_id, is_active=True).first()
+        if user is None:
+            return None
+        return Token(key=key, user=user, created=created)
+
+    def set(self, key, token):
+        self.remember(key, token)
+        if settings.TOKEN_CACHE_SHARED:
+            cache.set(shared_key(key), (token.user_id, token.created),
+                      settings.TOKEN_CACHE_TIMEOUT)
+
+    def remember(self, key, token):
+        expires = time.monotonic() + settings.TOKEN_CACHE_TIMEOUT
+        with self._lock:
+            self._entries[key] = (token, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if settings.TOKEN_CACHE_SHARED and keys:
+            cache.delete_many([shared_key(key) for key in keys])
+
+    def invalidate_user(self, user_id):
+        self.invalidate(Token.objects.filter(
+            user_id=user_id).values_list('key', flat=True))
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для недавно виденных
+    токенов. Каждый запрос получает свою копию пользователя."""
+
+    def authenticate_credentials(self, key):
+        token = token_cache.get(key)
+        if token is None:
+            _, token = super().authenticate_credentials(key)
+            token_cache.set(key, token)
+        return copy.copy(token.user), token
+
+
+def token_deleted(sender, instance, **kwargs):
+    token_cache.invalidate((instance.key,))
+
+
+def user_saved(sender, instance, created, **kwargs):
+    if not created and not instance.is_active:
+        token_cache.invalidate_user(instance.id)
@@ -0,0 +1,88 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from recipes.models import Ingredient
+
+
+class IngredientIndex:
+    """Префиксный индекс ингредиентов в памяти процесса.
+
+    Используется там, где в базе нет подходящего индекса (SQLite).
+    Отсортированный список имен с двоичным поиском работает как
+    префиксное дерево: все имена с общим префиксом лежат подряд.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built_at = None
+        # Имена и записи публикуются одним присваиванием, чтобы поиск
+        # в другом потоке не увидел новые имена со старыми записями.
+        self._index = ([], [])
+
+    def invalidate(self, **kwargs):
+        self._built_at = None
+
+    def _build(self):
+        items = sorted(
+            (name.lower(), ingredient_id, name, unit)
+            for ingredient_id, name, unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit__unit_name'))
+        self._index = (
+            [item[0] for item in items],
+            [{'id': ingredient_id, 'name': name, 'measurement_unit': unit}
+             for _, ingredient_id, name, unit in items])
+        self._built_at = time.monotonic()
+
+    def _ensure_built(self):
+        built_at = self._built_at
+        if (built_at is None or time.monotonic() - built_at
+                > settings.AUTOCOMPLETE_INDEX_TIMEOUT):
+            with self._lock:
+                if self._built_at is built_at:
+                    self._build()
+
+    def search(self, query, limit):
+        self._ensure_built()
+        names, items = self._index
+        query = query.lower()
+        start = bisect_left(names, query)
+        end = start
+        while end < len(names) and end - start < limit and (
+                names[end].startswith(query)):
+            end += 1
+        result = items[start:end]
+        if len(result) < limit:
+            for name, item in zip(names, items):
+                if query in name and not name.startswith(query):
+                    result.append(item)
+                    if len(result) == limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
+
+
+def search_database(query, limit):
+    """Поиск по индексам PostgreSQL: префиксные совпадения идут первыми."""
+
+    return [
+        {'id': ingredient_id, 'name': name, 'measurement_unit': unit}
+        for ingredient_id, name, unit in Ingredient.objects.filter(
+            name__icontains=query).annotate(
+                rank=Case(When(name__istartswith=query, then=Value(0)),
+                          default=Value(1), output_field=IntegerField())
+        ).order_by('rank', 'name').values_list(
+            'id', 'name', 'measurement_unit__unit_name')[:limit]
+    ]
+
+
+def autocomplete(query, limit):
+    if connection.vendor == 'postgresql':
+        return search_database(query, limit)
+    return ingredient_index.search(query, limit)
@@ -0,0 +1,290 @@
+"""Синтетические данные и сценарии для команды benchmarkapi."""
+
+import random
+import time
+import tracemalloc
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (COUNTERS, Favorite, FeedItem, Follow, Ingredient,
+                            IngredientRecipe, MeasurementUnit, Recipe,
+                            ShoppingCart, ShoppingListItem, Tag, TagRecipe,
+                            recount)
+from recipes.trending import COMMIT_LAG, update_trending
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-password'
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAA'
+    'CVBMVEUAAAD///9fX1/S0ecCAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNo'
+    'AAAAggCByxOyYQAAAABJRU5ErkJggg==')
+DATASET = {
+    'users': 200,
+    'recipes': 2000,
+    'ingredients': 500,
+    'tags': 10,
+    'ingredients_per_recipe': 8,
+    'tags_per_recipe': 2,
+    'follows': 30,
+    'favorites': 50,
+    'cart': 10,
+}
+BATCH_SIZE = 1000
+
+
+def seed(dataset, seed_value=0):
+    """Заполняет пустую базу и возвращает состояние для сценариев."""
+
+    rng = random.Random(seed_value)
+    password = make_password(PASSWORD)
+    User.objects.bulk_create(
+        [User(username=f'user{number}', email=f'user{number}@example.org',
+              first_name='Имя', last_name='Фамилия', password=password)
+         for number in range(dataset['users'] + 2)],
+        batch_size=BATCH_SIZE)
+    users = list(User.objects.order_by('id'))
+    bench, login_user, authors = users[0], users[1], users[2:]
+
+    unit = MeasurementUnit.objects.create(unit_name='г')
+    Ingredient.objects.bulk_create(
+        [Ingredient(name=f'ингредиент {number}', measurement_unit=unit)
+         for number in range(dataset['ingredients'])],
+        batch_size=BATCH_SIZE)
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    Tag.objects.bulk_create(
+        [Tag(name=f'Тег {number}', slug=f'tag{number}', color='#E26C2D')
+         for number in range(dataset['tags'])])
+    tags = list(Tag.objects.order_by('id'))
+
+    Recipe.objects.bulk_create(
+        [Recipe(author=rng.choice(authors), name=f'Рецепт {number}',
+                image='recipes/images/benchmark.png', text='Описание',
+                cooking_time=rng.randint(1, 120))
+         for number in range(dataset['recipes'])],
+        batch_size=BATCH_SIZE)
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    IngredientRecipe.objects.bulk_create(
+        [IngredientRecipe(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                          amount=rng.randint(1, 500))
+         for recipe_id in recipe_ids
+         for ingredient_id in rng.sample(
+             ingredient_ids, dataset['ingredients_per_recipe'])],
+        batch_size=BATCH_SIZE)
+    TagRecipe.objects.bulk_create(
+        [TagRecipe(recipe_id=recipe_id, tag=tag)
+         for recipe_id in recipe_ids
+         for tag in rng.sample(tags, dataset['tags_per_recipe'])],
+        batch_size=BATCH_SIZE)
+
+    follows, favorites, cart = [], [], []
+    for user in users[:2] + authors:
+        follows += [Follow(user=user, following=author) for author in
+                    rng.sample(authors, dataset['follows'])
+                    if author != user]
+        favorites += [Favorite(user=user, recipe_id=recipe_id) for recipe_id
+                      in rng.sample(recipe_ids, dataset['favorites'])]
+        cart += [ShoppingCart(user=user, recipe_id=recipe_id) for recipe_id
+                 in rng.sample(recipe_ids, dataset['cart'])]
+    Follow.objects.bulk_create(follows, batch_size=BATCH_SIZE)
+    Favorite.objects.bulk_create(favorites, batch_size=BATCH_SIZE)
+    ShoppingCart.objects.bulk_create(cart, batch_size=BATCH_SIZE)
+    ShoppingListItem.objects.bulk_create(
+        [ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                          total=total)
+         for user_id, ingredient_id, total in
+         ShoppingListItem.objects.calculate()],
+        batch_size=BATCH_SIZE)
+    for source, fk, field in COUNTERS:
+        recount(source, fk, field)
+    update_trending(timezone.now() + COMMIT_LAG)
+
+    followed = set(bench.follower.values_list('following_id', flat=True))
+    FeedItem.objects.backfill(bench.id, followed)
+    chosen = set(bench.favorite.values_list('recipe_id', flat=True)) | set(
+        bench.shopping_cart.values_list('recipe_id', flat=True))
+    return {
+        'bench': bench,
+        'login_user': login_user,
+        'token': Token.objects.create(user=bench).key,
+        'other_user': authors[0].id,
+        'unfollowed': next(author.id for author in authors
+                           if author.id not in followed),
+        'recipe': recipe_ids[0],
+        'free_recipe': next(recipe_id for recipe_id in recipe_ids
+                            if recipe_id not in chosen),
+        'ingredient': ingredient_ids[0],
+        'ingredients': ingredient_ids[:dataset['ingredients_per_recipe']],
+        'tag': tags[0].id,
+        'tag_slugs': [tag.slug for tag in tags[:2]],
+    }
+
+
+def recipe_payload(state, name):
+    return {
+        'name': name,
+        'text': 'Описание',
+        'cooking_time': 10,
+        'image': IMAGE,
+        'tags': [state['tag']],
+        'ingredients': [{'id': ingredient_id, 'amount': 10}
+                        for ingredient_id in state['ingredients']],
+    }
+
+
+def create_recipe(client, state):
+    return client.post(
+        '/api/recipes/', recipe_payload(state, 'Новый рецепт'),
+        format='json')
+
+
+def remember_created(state):
+    state['created'] = Recipe.objects.filter(
+        author=state['bench']).latest('id').id
+
+
+def login(client, state):
+    return APIClient().post('/api/auth/token/login/', {
+        'email': state['login_user'].email, 'password': PASSWORD})
+
+
+def logout(client, state):
+    token = Token.objects.get(user=state['login_user'])
+    anonymous = APIClient()
+    anonymous.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+    return anonymous.post('/api/auth/token/logout/')
+
+
+def get(path):
+    return lambda client, state: client.get(path.format(**state))
+
+
+def post(path, data=None):
+    return lambda client, state: client.post(
+        path.format(**state), data, format='json')
+
+
+def delete(path):
+    return lambda client, state: client.delete(path.format(**state))
+
+
+CASES = (
+    ('users.list', get('/api/users/?limit=10')),
+    ('users.retrieve', get('/api/users/{other_user}/')),
+    ('users.me', get('/api/users/me/')),
+    ('users.subscriptions',
+     get('/api/users/subscriptions/?limit=10&recipes_limit=3')),
+    ('users.subscribe', post('/api/users/{unfollowed}/subscribe/')),
+    ('users.unsubscribe', delete('/api/users/{unfollowed}/subscribe/')),
+    ('users.set_password', post('/api/users/set_password/', {
+        'current_password': PASSWORD, 'new_password': PASSWORD})),
+    ('ingredients.list', get('/api/ingredients/')),
+    ('ingredients.search', get('/api/ingredients/?name=ингредиент 1')),
+    ('ingredients.retrieve', get('/api/ingredients/{ingredient}/')),
+    ('ingredients.autocomplete',
+     get('/api/ingredients/autocomplete/?name=ингредиент 1')),
+    ('tags.list', get('/api/tags/')),
+    ('tags.retrieve', get('/api/tags/{tag}/')),
+    ('recipes.list', get('/api/recipes/?limit=50')),
+    ('recipes.list_filtered', lambda client, state: client.get(
+        '/api/recipes/', {'limit': 50, 'is_favorited': 1,
+                          'tags': state['tag_slugs']})),
+    ('recipes.search', get('/api/recipes/?limit=50&search=рецепт 1')),
+    ('recipes.list_popular',
+     get('/api/recipes/?limit=50&ordering=-favorites')),
+    ('recipes.list_cursor', get('/api/recipes/?limit=50&cursor=')),
+    ('recipes.trending', get('/api/recipes/trending/?limit=20')),
+    ('recipes.feed', get('/api/recipes/feed/?limit=20')),
+    ('recipes.retrieve', get('/api/recipes/{recipe}/')),
+    ('recipes.create', create_recipe),
+    ('recipes.update', lambda client, state: client.patch(
+        f'/api/recipes/{state["created"]}/',
+        recipe_payload(state, 'Обновленный рецепт'), format='json')),
+    ('recipes.destroy', delete('/api/recipes/{created}/')),
+    ('recipes.favorite', post('/api/recipes/{free_recipe}/favorite/')),
+    ('recipes.unfavorite', delete('/api/recipes/{free_recipe}/favorite/')),
+    ('recipes.shopping_cart',
+     post('/api/recipes/{free_recipe}/shopping_cart/')),
+    ('recipes.remove_from_cart',
+     delete('/api/recipes/{free_recipe}/shopping_cart/')),
+    ('recipes.download_shopping_cart',
+     get('/api/recipes/download_shopping_cart/?format=txt')),
+    ('recipes.download_shopping_cart_pdf',
+     get('/api/recipes/download_shopping_cart/')),
+    ('auth.login', login),
+    ('auth.logout', logout),
+)
+AFTER = {
+    'recipes.create': remember_created,
+}
+
+
+def call(name, case, client, state):
+    response = case(client, state)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+def measure(name, case, client, state):
+    """Выполняет сценарий, возвращает (статус, запросы, секунды)."""
+
+    with CaptureQueriesContext(connection) as queries:
+        started = time.perf_counter()
+        response = call(name, case, client, state)
+        elapsed = time.perf_counter() - started
+    if name in AFTER:
+        AFTER[name](state)
+    return response.status_code, len(queries), elapsed
+
+
+def measure_allocations(name, case, client, state):
+    """Пиковый объем памяти, выделенной за время сценария, в КиБ."""
+
+    tracemalloc.start()
+    try:
+        call(name, case, client, state)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    if name in AFTER:
+        AFTER[name](state)
+    return peak / 1024
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def run(state, repeat):
+    """Прогоняет все сценарии repeat раз и собирает метрики."""
+
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {state["token"]}')
+    timings = {name: [] for name, _ in CASES}
+    results = {}
+    for iteration in range(repeat + 1):
+        for name, case in CASES:
+            status, queries, elapsed = measure(name, case, client, state)
+            if status >= 400:
+                raise RuntimeError(f'{name}: ответ {status}')
+            if iteration:
+                timings[name].append(elapsed)
+            results[name] = {'queries': queries}
+    for name, case in CASES:
+        results[name].update({
+            'p50_ms': round(percentile(timings[name], 0.5) * 1000, 2),
+            'p95_ms': round(percentile(timings[name], 0.95) * 1000, 2),
+            'alloc_kb': round(
+                measure_allocations(name, case, client, state), 1),
+        })
+    return results
@@ -0,0 +1,109 @@
+"""Постоянные соединения с базой: проверка перед запросом и статистика.
+
+Соединения живут CONN_MAX_AGE секунд. При DB_HEALTH_CHECKS уже открытое
+соединение, простоявшее без запросов дольше DB_HEALTH_CHECK_IDLE секунд,
+в начале запроса проверяется пингом, и мертвое (например, после рестарта
+PostgreSQL или pgbouncer) закрывается до того, как на нем упадет запрос.
+Соединения, которыми только что пользовались, не пингуются: лишний
+SELECT 1 на каждый запрос съел бы выигрыш от постоянных соединений.
+Соединение, на котором случилась ошибка, Django 3.2 сам проверяет
+и закрывает в конце запроса (close_if_unusable_or_obsolete). Это
+настройки проекта, а не Django: их читает только check_connections.
+
+Статистика своя у каждого процесса: сколько соединений открыто заново,
+сколько запросов получили уже открытое соединение и сколько времени ушло
+на подключение и проверки. Ожидание соединения (подключение для нового,
+проверка для открытого) копится еще и в гистограмме по
+CONNECTION_WAIT_BUCKETS.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import connections
+
+
+class ConnectionStats:
+
+    FIELDS = ('opened', 'reused', 'unusable', 'connect_seconds',
+              'check_seconds')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._values = dict.fromkeys(self.FIELDS, 0)
+            self._values['wait_seconds'] = 0
+            self._values['wait_buckets'] = [0] * (
+                len(settings.CONNECTION_WAIT_BUCKETS) + 1)
+
+    def add(self, **values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] += value
+
+    def add_wait(self, seconds):
+        """Время, за которое запрос получил рабочее соединение."""
+
+        with self._lock:
+            self._values['wait_seconds'] += seconds
+            self._values['wait_buckets'][bisect_left(
+                settings.CONNECTION_WAIT_BUCKETS, seconds)] += 1
+
+    def snapshot(self):
+        with self._lock:
+            values = dict(self._values)
+            values['wait_buckets'] = list(values['wait_buckets'])
+            return values
+
+
+stats = ConnectionStats()
+
+
+def connection_opened(sender, connection, **kwargs):
+    """Считает новое соединение и время подключения.
+
+    Django выставляет close_at = начало connect() + CONN_MAX_AGE до
+    подключения, отсюда и берется время начала.
+    """
+
+    max_age = connection.settings_dict['CONN_MAX_AGE']
+    connect_seconds = 0
+    if connection.close_at is not None and max_age is not None:
+        connect_seconds = time.monotonic() - (connection.close_at - max_age)
+    connection.handed_out_at = time.monotonic()
+    stats.add(opened=1, connect_seconds=connect_seconds)
+    stats.add_wait(connect_seconds)
+
+
+def check_connections(**kwargs):
+    """Проверяет открытые соединения потока перед запросом.
+
+    Вызывается по request_started после close_old_connections и в потоках
+    пула асинхронных представлений. Простой считается от начала
+    предыдущего запроса, получившего соединение.
+    """
+
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None:
+            continue
+        idle = now - getattr(connection, 'handed_out_at', now)
+        connection.handed_out_at = now
+        check_seconds = 0
+        if (settings.DB_HEALTH_CHECKS
+                and idle > settings.DB_HEALTH_CHECK_IDLE):
+            started = time.monotonic()
+            usable = connection.is_usable()
+            check_seconds = time.monotonic() - started
+            stats.add(check_seconds=check_seconds)
+            if not usable:
+                connection.close()
+                stats.add(unusable=1)
+                continue
+        stats.add(reused=1)
+        stats.add_wait(check_seconds)
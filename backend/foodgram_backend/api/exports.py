@@ -0,0 +1,130 @@
+import csv
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFError, TTFont
+from reportlab.pdfgen import canvas
+
+from recipes.models import ShoppingListItem
+
+logger = logging.getLogger(__name__)
+
+DOCUMENT_KEY = 'shopping_list:{}:{}'
+
+_font_name = None
+
+
+def register_font():
+    """Регистрирует шрифт для PDF. Вызывается один раз при старте.
+
+    Встроенные шрифты PDF не содержат кириллицы, поэтому без шрифта
+    FONT_FILE PDF не собирается: render_pdf падает с ошибкой, а не
+    отдает нечитаемый документ.
+    """
+
+    global _font_name
+    try:
+        pdfmetrics.registerFont(
+            TTFont(settings.FONT_NAME, settings.FONT_FILE))
+    except TTFError as error:
+        logger.error(f'Шрифт {settings.FONT_FILE} не загружен: {error}')
+        return False
+    _font_name = settings.FONT_NAME
+    return True
+
+
+def aggregate_shopping_list(user):
+    """Читает агрегированный список покупок пользователя."""
+
+    return list(ShoppingListItem.objects.filter(user=user).values_list(
+        'ingredient__name', 'ingredient__measurement_unit__unit_name',
+        'total').order_by('ingredient__name'))
+
+
+def get_digest(items):
+    """Хэш содержимого списка покупок."""
+
+    digest = hashlib.sha1()
+    for name, unit, total in items:
+        digest.update(f'{name}\t{unit}\t{total}\n'.encode())
+    return digest.hexdigest()
+
+
+def render_txt(items):
+    return ''.join(
+        f'{name} {total}{unit}\n' for name, unit, total in items).encode()
+
+
+def render_csv(items):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(('name', 'amount', 'measurement_unit'))
+    for name, unit, total in items:
+        writer.writerow((name, total, unit))
+    return buffer.getvalue().encode()
+
+
+def render_pdf(items):
+    """Рендерит список в PDF, перенося строки на новые страницы."""
+
+    if _font_name is None and not register_font():
+        raise ImproperlyConfigured(
+            f'Шрифт {settings.FONT_FILE} не загружен, задайте FONT_FILE.')
+    buffer = io.BytesIO()
+    pdf_canvas = canvas.Canvas(buffer, pagesize=A4, bottomup=0)
+    leading = settings.FONT_SIZE * 1.2
+    lines_per_page = max(int((A4[1] - 2 * cm) // leading), 1)
+
+    for start in range(0, max(len(items), 1), lines_per_page):
+        text_obj = pdf_canvas.beginText()
+        text_obj.setTextOrigin(cm, cm)
+        text_obj.setFont(_font_name, settings.FONT_SIZE, leading)
+        for name, unit, total in items[start:start + lines_per_page]:
+            text_obj.textLine(f'{name} {total}{unit}')
+        pdf_canvas.drawText(text_obj)
+        pdf_canvas.showPage()
+    pdf_canvas.save()
+    return buffer.getvalue()
+
+
+FORMATS = {
+    'pdf': (render_pdf, 'application/pdf'),
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'csv': (render_csv, 'text/csv; charset=utf-8'),
+}
+
+
+def get_shopping_list(user, file_format):
+    """Возвращает готовый документ из кэша или собирает его заново.
+
+    Ключ документа - хэш агрегированного содержимого корзины: после любого
+    изменения корзины или рецептов в ней ключ меняется сам, поэтому
+    документ не нужно сбрасывать ни в одном процессе, а одинаковые корзины
+    разделяют один документ.
+    """
+
+    items = aggregate_shopping_list(user)
+    document_key = DOCUMENT_KEY.format(file_format, get_digest(items))
+    document = cache.get(document_key)
+    if document is None:
+        render, _ = FORMATS[file_format]
+        document = render(items)
+        cache.set(document_key, document,
+                  settings.SHOPPING_LIST_CACHE_TIMEOUT)
+    return document
+
+
+def iter_chunks(document):
+    """Отдает готовый документ частями по EXPORT_CHUNK_SIZE байт."""
+
+    view = memoryview(document)
+    for start in range(0, len(view), settings.EXPORT_CHUNK_SIZE):
+        yield bytes(view[start:start + settings.EXPORT_CHUNK_SIZE])
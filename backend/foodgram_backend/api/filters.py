@@ -1,6 +1,22 @@
+from django.db.models import Exists, OuterRef
+
 import django_filters
+from django_filters.constants import EMPTY_VALUES
+
+from recipes.models import Favorite, Recipe, ShoppingCart, TagRecipe
+from recipes.search import search_recipes
+
 
-from recipes.models import Recipe
+class PopularityOrderingFilter(django_filters.OrderingFilter):
+    """Сортировка с дополнительной сортировкой по id в том же направлении,
+    чтобы выборка по популярности шла по индексу recipe_popularity_idx."""
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        return qs.order_by(
+            *ordering, '-id' if ordering[-1].startswith('-') else 'id')
 
 
 class RecipeFilter(django_filters.FilterSet):
@@ -10,22 +26,33 @@ class RecipeFilter(django_filters.FilterSet):
         field_name='is_favorited', method='filter_is_favorited')
     is_in_shopping_cart = django_filters.NumberFilter(
         field_name='is_in_shopping_cart', method='filter_is_in_shopping_cart')
+    search = django_filters.CharFilter(method='filter_search')
+    ordering = PopularityOrderingFilter(
+        fields=(('favorites_count', 'favorites'),))
 
     def filter_tags(self, queryset, name, value):
         captured_value = self.request.GET.getlist('tags')
         if captured_value:
-            return queryset.filter(tags__slug__in=captured_value).distinct()
+            return queryset.filter(Exists(TagRecipe.objects.filter(
+                recipe=OuterRef('pk'), tag__slug__in=captured_value)))
         return queryset
 
     def filter_is_favorited(self, queryset, name, value):
-        if self.request.user.is_authenticated:
-            return queryset.filter(favorite__user=self.request.user).distinct()
+        if value and self.request.user.is_authenticated:
+            return queryset.filter(Exists(Favorite.objects.filter(
+                recipe=OuterRef('pk'), user=self.request.user)))
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
-        if self.request.user.is_authenticated:
-            return queryset.filter(
-                shopping_cart__user=self.request.user).distinct()
+        if value and self.request.user.is_authenticated:
+            return queryset.filter(Exists(ShoppingCart.objects.filter(
+                recipe=OuterRef('pk'), user=self.request.user)))
+        return queryset
+
+    def filter_search(self, queryset, name, value):
+        value = value.strip()
+        if value:
+            return search_recipes(queryset, value)
         return queryset
 
     class Meta:
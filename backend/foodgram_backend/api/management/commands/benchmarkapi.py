@@ -0,0 +1,98 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import (BaseCommand, CommandError,
+                                         CommandParser)
+from django.db import connection
+from django.test.utils import override_settings
+
+from api import benchmark
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'data' / 'benchmark.json'
+
+
+class Command(BaseCommand):
+    help = ('Заполняет тестовую базу синтетическими данными, измеряет '
+            'число SQL-запросов, задержку и память для каждого эндпоинта '
+            'и сравнивает результат с сохраненным эталоном.')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        for key, value in benchmark.DATASET.items():
+            parser.add_argument(f'--{key.replace("_", "-")}', type=int,
+                                default=value, dest=key)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--baseline', type=Path,
+                            default=DEFAULT_BASELINE)
+        parser.add_argument('--update-baseline', action='store_true')
+        parser.add_argument('--latency-tolerance', type=float, default=3.0,
+                            help='Допустимый рост p50 относительно эталона.')
+        parser.add_argument('--alloc-tolerance', type=float, default=1.5,
+                            help='Допустимый рост памяти относительно '
+                                 'эталона.')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        dataset = {key: options[key] for key in benchmark.DATASET}
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False,
+            keepdb=options['keepdb'])
+        try:
+            with tempfile.TemporaryDirectory() as media_root:
+                with override_settings(MEDIA_ROOT=media_root):
+                    state = benchmark.seed(dataset)
+                    results = benchmark.run(state, options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(
+                old_name, verbosity=0, keepdb=options['keepdb'])
+
+        self.report(results)
+        report = {'vendor': connection.vendor, 'dataset': dataset,
+                  'endpoints': results}
+        if options['update_baseline']:
+            options['baseline'].write_text(
+                json.dumps(report, ensure_ascii=False, indent=2) + '\n')
+            self.stdout.write(f'Эталон сохранен в {options["baseline"]}.')
+            return
+        if not options['baseline'].exists():
+            self.stdout.write('Эталон не найден, сравнение пропущено.')
+            return
+        self.compare(report, json.loads(options['baseline'].read_text()),
+                     options)
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"endpoint":<36}{"queries":>8}{"p50, ms":>10}'
+            f'{"p95, ms":>10}{"alloc, KiB":>12}')
+        for name, metrics in results.items():
+            self.stdout.write(
+                f'{name:<36}{metrics["queries"]:>8}{metrics["p50_ms"]:>10}'
+                f'{metrics["p95_ms"]:>10}{metrics["alloc_kb"]:>12}')
+
+    def compare(self, report, baseline, options):
+        if (baseline.get('dataset') != report['dataset']
+                or baseline.get('vendor') != report['vendor']):
+            self.stdout.write(
+                'Эталон снят на другой СУБД или другом наборе данных: '
+                'сравнивается только число запросов.')
+            options['latency_tolerance'] = options['alloc_tolerance'] = None
+
+        failures = []
+        for name, metrics in report['endpoints'].items():
+            expected = baseline['endpoints'].get(name)
+            if expected is None:
+                continue
+            if metrics['queries'] > expected['queries']:
+                failures.append(f'{name}: запросов {metrics["queries"]}, '
+                                f'эталон {expected["queries"]}')
+            for key, tolerance in (('p50_ms', options['latency_tolerance']),
+                                   ('alloc_kb', options['alloc_tolerance'])):
+                if tolerance and metrics[key] > expected[key] * tolerance:
+                    failures.append(f'{name}: {key} {metrics[key]}, '
+                                    f'эталон {expected[key]}')
+        if failures:
+            raise CommandError(
+                'Превышен эталон:\n' + '\n'.join(failures))
+        self.stdout.write('Все эндпоинты укладываются в эталон.')
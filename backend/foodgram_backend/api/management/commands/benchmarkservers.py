@@ -0,0 +1,295 @@
+import asyncio
+import io
+import json
+import random
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import (BaseCommand, CommandError,
+                                         CommandParser)
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from api import benchmark
+from api.connections import stats as connection_stats
+from api.reference_cache import DATASETS, reference_cache
+from foodgram_backend.asgi import AsyncAPIHandler
+
+MIX = (
+    ('recipes.list', 'GET', '/api/recipes/', {'limit': 20}, 40),
+    ('recipes.retrieve', 'GET', '/api/recipes/{recipe}/', {}, 25),
+    ('ingredients.search', 'GET', '/api/ingredients/',
+     {'name': 'ингредиент 1'}, 10),
+    ('tags.list', 'GET', '/api/tags/', {}, 10),
+    ('recipes.download_shopping_cart', 'GET',
+     '/api/recipes/download_shopping_cart/', {}, 10),
+    ('auth.login', 'POST', '/api/auth/token/login/', {}, 5),
+)
+MODES = ('wsgi', 'asgi')
+
+
+def build_requests(state, count, seed_value=0):
+    """Детерминированная последовательность запросов по весам MIX."""
+
+    rng = random.Random(seed_value)
+    login = json.dumps({'email': state['login_user'].email,
+                       'password': benchmark.PASSWORD}).encode()
+    headers = {'authorization': f'Token {state["token"]}'}
+    requests = []
+    for name, method, path, query, _ in rng.choices(
+            MIX, weights=[case[-1] for case in MIX], k=count):
+        requests.append({
+            'name': name, 'method': method, 'path': path.format(**state),
+            'query': urlencode(query),
+            'body': login if method == 'POST' else b'',
+            'headers': {} if method == 'POST' else headers})
+    return requests
+
+
+def wsgi_environ(request):
+    environ = {
+        'REQUEST_METHOD': request['method'],
+        'PATH_INFO': request['path'],
+        'QUERY_STRING': request['query'],
+        'SERVER_NAME': 'testserver',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(request['body'])),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(request['body']),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': False,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for header, value in request['headers'].items():
+        environ[f'HTTP_{header.upper()}'] = value
+    return environ
+
+
+class WSGIServer:
+    """Синхронный воркер gunicorn: один запрос за раз."""
+
+    threads = 1
+
+    def __init__(self):
+        self.handler = WSGIHandler()
+        self.executor = ThreadPoolExecutor(self.threads)
+
+    def handle(self, request):
+        status = []
+        response = self.handler(
+            wsgi_environ(request),
+            lambda line, headers: status.append(int(line.split()[0])))
+        try:
+            b''.join(response)
+        finally:
+            response.close()
+        return status[0]
+
+    async def __call__(self, request):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.handle, request)
+
+    def close(self):
+        self.executor.shutdown()
+
+
+class ASGIServer:
+    """Воркер uvicorn: обработчик из foodgram_backend.asgi."""
+
+    def __init__(self):
+        self.handler = AsyncAPIHandler()
+
+    async def __call__(self, request):
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': request['method'],
+            'scheme': 'http',
+            'path': request['path'],
+            'raw_path': request['path'].encode(),
+            'query_string': request['query'].encode(),
+            'root_path': '',
+            'headers': [(b'host', b'testserver'),
+                        (b'content-type', b'application/json'),
+                        (b'content-length',
+                         str(len(request['body'])).encode())] + [
+                (header.encode(), value.encode())
+                for header, value in request['headers'].items()],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        messages = [{'type': 'http.request', 'body': request['body'],
+                     'more_body': False}]
+        status = []
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            return await asyncio.get_running_loop().create_future()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        await self.handler(scope, receive, send)
+        return status[0]
+
+    def close(self):
+        pass
+
+
+SERVERS = {'wsgi': WSGIServer, 'asgi': ASGIServer}
+
+
+class NetworkDelay:
+    """Задержка перед каждым SQL-запросом: имитирует сетевой обмен
+    с сервером СУБД, которого нет у SQLite."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        time.sleep(self.seconds)
+        return execute(sql, params, many, context)
+
+    def install(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+
+async def drive(server, requests, concurrency):
+    """Прогоняет запросы concurrency клиентами, каждый из которых
+    отправляет следующий запрос после ответа на предыдущий."""
+
+    pending = iter(requests)
+    timings = {}
+    errors = []
+
+    async def client():
+        for request in pending:
+            started = time.perf_counter()
+            status = await server(request)
+            timings.setdefault(request['name'], []).append(
+                time.perf_counter() - started)
+            if status >= 400:
+                errors.append(f'{request["name"]}: ответ {status}')
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return timings, time.perf_counter() - started, errors
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность и задержки одного '
+            'синхронного воркера WSGI (gunicorn по умолчанию) и одного '
+            'воркера ASGI на смеси запросов к API. Процесс один, поэтому '
+            'память у режимов одинаковая.')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        for key, value in benchmark.DATASET.items():
+            parser.add_argument(f'--{key.replace("_", "-")}', type=int,
+                                default=value, dest=key)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--modes', nargs='+', choices=MODES,
+                            default=list(MODES))
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Задержка на SQL-запрос, мс.')
+        parser.add_argument('--keepdb', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError(
+                '--requests и --concurrency должны быть больше нуля.')
+        dataset = {key: options[key] for key in benchmark.DATASET}
+        with tempfile.TemporaryDirectory() as media_root:
+            if connection.vendor == 'sqlite':
+                # В общей базе SQLite в памяти блокировки потабличные и
+                # без ожидания, а воркеру ASGI нужны параллельные запросы.
+                connection.settings_dict['TEST']['NAME'] = str(
+                    Path(media_root) / 'benchmark.sqlite3')
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False,
+                keepdb=options['keepdb'])
+            try:
+                with override_settings(MEDIA_ROOT=media_root,
+                                       ALLOWED_HOSTS=['testserver']):
+                    state = benchmark.seed(dataset)
+                    requests = build_requests(state, options['requests'])
+                    delay = NetworkDelay(options['db_latency'] / 1000)
+                    if delay.seconds:
+                        connection_created.connect(delay.install)
+                    try:
+                        results = {
+                            mode: self.run_mode(mode, requests, options)
+                            for mode in options['modes']}
+                    finally:
+                        connection_created.disconnect(delay.install)
+            finally:
+                connection.creation.destroy_test_db(
+                    old_name, verbosity=0, keepdb=options['keepdb'])
+        self.report(results)
+
+    def run_mode(self, mode, requests, options):
+        cache.clear()
+        for dataset in set(DATASETS.values()):
+            reference_cache.invalidate(dataset)
+        connection_stats.reset()
+        server = SERVERS[mode]()
+        try:
+            timings, elapsed, errors = asyncio.run(
+                drive(server, requests, options['concurrency']))
+        finally:
+            server.close()
+        if errors:
+            raise CommandError(f'{mode}: ' + '; '.join(errors[:5]))
+        return {
+            'rps': round(len(requests) / elapsed, 1),
+            'timings': timings,
+            'connections': connection_stats.snapshot(),
+            'maxrss_mb': round(resource.getrusage(
+                resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"mode":<8}{"endpoint":<34}{"p50, ms":>10}{"p95, ms":>10}'
+            f'{"p99, ms":>10}')
+        for mode, result in results.items():
+            everything = []
+            for name, values in sorted(result['timings'].items()):
+                everything += values
+                self.write_row(mode, name, values)
+            self.write_row(mode, 'все запросы', everything)
+            self.stdout.write(
+                f'{mode}: {result["rps"]} запросов/с, пиковый RSS процесса '
+                f'{result["maxrss_mb"]} МиБ.')
+            self.write_connections(mode, result['connections'])
+
+    def write_connections(self, mode, stats):
+        self.stdout.write(
+            f'{mode}: соединений с базой открыто {stats["opened"]} '
+            f'({stats["connect_seconds"] * 1000:.1f} мс), '
+            f'переиспользовано {stats["reused"]}, '
+            f'проверки {stats["check_seconds"] * 1000:.1f} мс, '
+            f'закрыто неисправных {stats["unusable"]}.')
+
+    def write_row(self, mode, name, values):
+        self.stdout.write(
+            f'{mode:<8}{name:<34}' + ''.join(
+                f'{benchmark.percentile(values, fraction) * 1000:>10.1f}'
+                for fraction in (0.5, 0.95, 0.99)))
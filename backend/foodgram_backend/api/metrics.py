@@ -0,0 +1,373 @@
+"""Метрики запросов к API в формате Prometheus.
+
+MetricsMiddleware считает для каждого представления DRF и действия
+(RecipeViewSet.list, RecipeViewSet.download_shopping_cart, ...) число
+запросов по статусам, гистограмму времени ответа, число и время
+SQL-запросов и объем ответов. Счетчики копятся в памяти процесса и раз
+в METRICS_FLUSH_INTERVAL секунд сбрасываются в файл процесса в каталоге
+METRICS_DIR. /api/metrics складывает файлы всех процессов, поэтому под
+gunicorn видны все воркеры. Файлы завершившихся процессов переносятся
+в общий dead.json, чтобы счетчики не убывали, а новый процесс с тем же
+PID не затер чужой файл. Без METRICS_DIR отдаются только счетчики
+процесса, обработавшего запрос.
+"""
+
+import asyncio
+import atexit
+import hmac
+import ipaddress
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: воркеров gunicorn там не бывает.
+    fcntl = None
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.deprecation import MiddlewareMixin
+
+from jobs.models import Job
+
+from .connections import stats as connection_stats
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+OTHER_VIEW = 'other'
+DEAD_FILE = 'dead.json'
+
+current_queries = ContextVar('current_queries', default=None)
+
+
+def view_name(request):
+    """Имя представления DRF и действия для подписи метрик."""
+
+    match = getattr(request, 'resolver_match', None)
+    view_class = getattr(match and match.func, 'cls', None)
+    if view_class is None:
+        return OTHER_VIEW
+    method = request.method.lower()
+    actions = getattr(match.func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+def response_size(response):
+    if response.streaming:
+        return int(response.get('Content-Length') or 0)
+    return len(response.content)
+
+
+def empty_view():
+    return {'requests': {}, 'buckets': [0] * (len(settings.METRICS_BUCKETS)
+                                              + 1),
+            'seconds': 0.0, 'queries': 0, 'query_seconds': 0.0, 'bytes': 0}
+
+
+class Metrics:
+    """Счетчики процесса и их файл в METRICS_DIR."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = None
+        self._views = {}
+        self._flushed = 0.0
+        self._reaped = None
+
+    def record(self, view, status, seconds, queries, query_seconds, size):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._views = {}
+            stats = self._views.get(view)
+            if stats is None:
+                stats = self._views[view] = empty_view()
+            status = str(status)
+            stats['requests'][status] = stats['requests'].get(status, 0) + 1
+            stats['buckets'][bisect_left(
+                settings.METRICS_BUCKETS, seconds)] += 1
+            stats['seconds'] += seconds
+            stats['queries'] += queries
+            stats['query_seconds'] += query_seconds
+            stats['bytes'] += size
+        if (settings.METRICS_DIR and time.monotonic() - self._flushed
+                > settings.METRICS_FLUSH_INTERVAL):
+            self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            views = json.loads(json.dumps(self._views))
+        return {'views': views, 'connections': connection_stats.snapshot()}
+
+    def flush_at_exit(self):
+        """Сохраняет счетчики, накопленные после последнего сброса."""
+
+        if settings.METRICS_DIR and self._pid == os.getpid():
+            self.flush()
+
+    def flush(self):
+        """Атомарно перезаписывает файл процесса текущими счетчиками."""
+
+        self._flushed = time.monotonic()
+        directory = Path(settings.METRICS_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        if self._reaped != os.getpid():
+            # Файл с нашим PID мог остаться от завершившегося процесса.
+            self._reaped = os.getpid()
+            reap(directory, own=os.getpid())
+        write_file(directory / f'{os.getpid()}.json', self.snapshot())
+
+    def collect(self):
+        """Счетчики всех процессов, сложенные вместе."""
+
+        if not settings.METRICS_DIR:
+            return self.snapshot()
+        self.flush()
+        directory = Path(settings.METRICS_DIR)
+        reap(directory)
+        total = empty_total()
+        for path in directory.glob('*.json'):
+            data = read_file(path)
+            if data is not None:
+                merge(total, data)
+        return total
+
+
+def empty_total():
+    return {'views': {}, 'connections': {}}
+
+
+def read_file(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def write_file(path, data):
+    """Атомарно перезаписывает файл счетчиков."""
+
+    temporary = path.with_suffix(f'.{threading.get_ident()}.tmp')
+    temporary.write_text(json.dumps(data))
+    os.replace(temporary, path)
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def reap(directory, own=None):
+    """Переносит счетчики завершившихся процессов в DEAD_FILE и удаляет
+    их файлы, как mark_process_dead в prometheus_client.
+
+    Файл с PID own удаляется без проверки: его оставил прежний процесс
+    с тем же PID. Перенос идет под блокировкой файла .lock, поэтому
+    параллельные воркеры не сложат один файл дважды.
+    """
+
+    if fcntl is None:
+        return
+    with open(directory / '.lock', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = [path for path in directory.glob('*.json')
+                if path.stem.isdigit() and (
+                    int(path.stem) == own
+                    or not process_alive(int(path.stem)))]
+        if not dead:
+            return
+        total = read_file(directory / DEAD_FILE) or empty_total()
+        for path in dead:
+            data = read_file(path)
+            if data is not None:
+                merge(total, data)
+        write_file(directory / DEAD_FILE, total)
+        for path in dead:
+            path.unlink()
+
+
+def merge(total, data):
+    for key, value in data['connections'].items():
+        if key == 'wait_buckets':
+            value = [a + b for a, b in zip(
+                total['connections'].get(key, [0] * len(value)), value)]
+        else:
+            value += total['connections'].get(key, 0)
+        total['connections'][key] = value
+    for view, stats in data['views'].items():
+        target = total['views'].setdefault(view, empty_view())
+        for status, count in stats['requests'].items():
+            target['requests'][status] = (
+                target['requests'].get(status, 0) + count)
+        target['buckets'] = [
+            a + b for a, b in zip(target['buckets'], stats['buckets'])]
+        for key in ('seconds', 'queries', 'query_seconds', 'bytes'):
+            target[key] += stats[key]
+
+
+metrics = Metrics()
+atexit.register(metrics.flush_at_exit)
+
+
+def record_query(execute, sql, params, many, context):
+    """Обертка execute_wrappers: время SQL-запросов текущего запроса."""
+
+    queries = current_queries.get()
+    if queries is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        queries[0] += 1
+        queries[1] += time.perf_counter() - started
+
+
+def install_query_wrapper(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Замеряет запрос целиком. Работает и под WSGI, и под ASGI: SQL-запросы
+    из потоков пула попадают в тот же счетчик через current_queries."""
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        queries = [0, 0.0]
+        token = current_queries.set(queries)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, started, queries)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        queries = [0, 0.0]
+        token = current_queries.set(queries)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_queries.reset(token)
+        self.record(request, response, started, queries)
+        return response
+
+    def record(self, request, response, started, queries):
+        metrics.record(view_name(request), response.status_code,
+                       time.perf_counter() - started, queries[0], queries[1],
+                       response_size(response))
+
+
+def labels(**values):
+    return '{' + ','.join(
+        f'{key}="{value}"' for key, value in values.items()) + '}'
+
+
+def render_views(views):
+    lines = [
+        '# HELP foodgram_http_requests_total Запросы по представлениям.',
+        '# TYPE foodgram_http_requests_total counter']
+    for view, stats in sorted(views.items()):
+        for status, count in sorted(stats['requests'].items()):
+            lines.append(f'foodgram_http_requests_total'
+                         f'{labels(view=view, status=status)} {count}')
+    lines += [
+        '# HELP foodgram_http_request_duration_seconds Время ответа.',
+        '# TYPE foodgram_http_request_duration_seconds histogram']
+    for view, stats in sorted(views.items()):
+        cumulative = 0
+        bounds = [str(bound) for bound in settings.METRICS_BUCKETS]
+        for bound, count in zip(bounds + ['+Inf'], stats['buckets']):
+            cumulative += count
+            lines.append(f'foodgram_http_request_duration_seconds_bucket'
+                         f'{labels(view=view, le=bound)} {cumulative}')
+        lines += [
+            f'foodgram_http_request_duration_seconds_sum{labels(view=view)} '
+            f'{stats["seconds"]}',
+            f'foodgram_http_request_duration_seconds_count'
+            f'{labels(view=view)} {cumulative}']
+    for name, key, help_text in (
+            ('foodgram_db_queries_total', 'queries', 'SQL-запросы.'),
+            ('foodgram_db_query_duration_seconds_total', 'query_seconds',
+             'Время SQL-запросов.'),
+            ('foodgram_http_response_bytes_total', 'bytes',
+             'Объем ответов.')):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines += [f'{name}{labels(view=view)} {stats[key]}'
+                  for view, stats in sorted(views.items())]
+    return lines
+
+
+def render_connections(connections):
+    connections = dict(connections)
+    buckets = connections.pop('wait_buckets', [])
+    wait_seconds = connections.pop('wait_seconds', 0)
+    lines = []
+    for key, value in sorted(connections.items()):
+        name = f'foodgram_db_connections_{key}_total'
+        lines += [f'# TYPE {name} counter', f'{name} {value}']
+    name = 'foodgram_db_connection_wait_seconds'
+    lines += [f'# HELP {name} Ожидание рабочего соединения в начале запроса.',
+              f'# TYPE {name} histogram']
+    cumulative = 0
+    bounds = [str(bound) for bound in settings.CONNECTION_WAIT_BUCKETS]
+    for bound, count in zip(bounds + ['+Inf'], buckets):
+        cumulative += count
+        lines.append(f'{name}_bucket{labels(le=bound)} {cumulative}')
+    lines += [f'{name}_sum {wait_seconds}', f'{name}_count {cumulative}']
+    return lines
+
+
+def render_jobs():
+    stats = Job.objects.stats()
+    lines = ['# HELP foodgram_jobs Задачи очереди по статусам.',
+             '# TYPE foodgram_jobs gauge']
+    lines += [f'foodgram_jobs{labels(status=status)} {count}'
+              for status, count in stats['counts'].items()]
+    lines += ['# TYPE foodgram_job_queue_lag_seconds gauge',
+              f'foodgram_job_queue_lag_seconds '
+              f'{stats["queue_lag"].total_seconds()}']
+    return lines
+
+
+def metrics_allowed(request):
+    """Доступ к метрикам: по METRICS_TOKEN (заголовок Authorization:
+    Bearer <токен>), администраторам и адресам из METRICS_ALLOWED_IPS.
+    Остальным, в том числе при пустых настройках, доступ закрыт."""
+
+    if settings.METRICS_TOKEN and hmac.compare_digest(
+            request.META.get('HTTP_AUTHORIZATION', '').encode(),
+            f'Bearer {settings.METRICS_TOKEN}'.encode()):
+        return True
+    if request.user.is_staff:
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False)
+               for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    collected = metrics.collect()
+    lines = (render_views(collected['views'])
+             + render_connections(collected['connections']) + render_jobs())
+    return HttpResponse('\n'.join(lines) + '\n', content_type=CONTENT_TYPE)
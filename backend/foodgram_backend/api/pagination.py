@@ -1,11 +1,117 @@
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger
+from django.core.paginator import Paginator as DjangoPaginator
+from django.db import connections
+from django.utils.functional import cached_property
+
 from rest_framework import pagination
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 
 
+def estimate_count(queryset):
+    """Оценка количества строк по статистике планировщика PostgreSQL.
+
+    На остальных СУБД выполняется обычный COUNT(*).
+    """
+
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return queryset.count()
+    sql, params = queryset.order_by().query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedPage(Page):
+    has_more = False
+
+    def has_next(self):
+        return self.has_more
+
+
+class EstimatedCountPaginator(DjangoPaginator):
+    """Пагинатор без COUNT(*): наличие следующей страницы определяется
+    лишней строкой в выборке, общее количество - оценкой планировщика."""
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        object_list = list(
+            self.object_list[bottom:bottom + self.per_page + 1])
+        if not object_list and number > 1:
+            raise EmptyPage('That page contains no results')
+        page = EstimatedPage(object_list[:self.per_page], number, self)
+        page.has_more = len(object_list) > self.per_page
+        return page
+
+
+class KeysetPagination(pagination.CursorPagination):
+    """Курсорная пагинация по ключу сортировки вьюсета (cursor_ordering).
+
+    Курсор хранит только позицию по этому ключу, поэтому выборку,
+    которую фильтры уже отсортировали иначе (?ordering=, ?search=),
+    постранично по курсору не отдать: такой запрос отклоняется.
+    """
+
+    page_size_query_param = 'limit'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = (view.cursor_ordering,)
+        if queryset.query.order_by and (
+                tuple(queryset.query.order_by) != ordering):
+            raise ValidationError({self.cursor_query_param: [
+                'Курсор нельзя сочетать с сортировкой и поиском.']})
+        return ordering
+
+
 class CustomPagination(pagination.PageNumberPagination):
+    """Постраничная пагинация с курсорным режимом (?cursor=) и оценкой
+    общего количества (?count=estimate)."""
+
     page_size_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        estimate = (
+            request.query_params.get(self.count_query_param) == 'estimate')
+        self.keyset = None
+        if (self.cursor_query_param in request.query_params
+                and getattr(view, 'cursor_ordering', None)):
+            self.keyset = KeysetPagination()
+            self.estimated_count = (
+                estimate_count(queryset) if estimate else None)
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        self.django_paginator_class = (
+            EstimatedCountPaginator if estimate else DjangoPaginator)
+        return super().paginate_queryset(queryset, request, view)
 
     def get_paginated_response(self, data):
+        if self.keyset is not None:
+            response = {
+                'next': self.keyset.get_next_link(),
+                'previous': self.keyset.get_previous_link(),
+                'results': data}
+            if self.estimated_count is not None:
+                response = {'count': self.estimated_count, **response}
+            return Response(response)
+
         return Response(
             {
                 'count': self.page.paginator.count,
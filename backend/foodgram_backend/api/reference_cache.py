@@ -0,0 +1,125 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils import timezone
+from django.utils.http import http_date, parse_http_date_safe
+
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, MeasurementUnit, ReferenceVersion, Tag
+
+DATASETS = {
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+    MeasurementUnit: 'ingredients',
+}
+
+
+class Entry:
+    __slots__ = ('version', 'body', 'etag', 'created')
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        self.created = time.monotonic()
+
+
+class ReferenceCache:
+    """Кэш готовых JSON-ответов справочников в памяти процесса.
+
+    Версия набора данных - время его последнего изменения в таблице
+    ReferenceVersion. Сигналы сохранения и удаления меняют ее в той же
+    транзакции, что и данные, поэтому все процессы видят одну версию, а
+    записи других версий считаются устаревшими. Версия читается из той же
+    базы, что и данные (в том числе с реплики).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get_version(self, dataset):
+        version = ReferenceVersion.objects.filter(
+            dataset=dataset).values_list('changed', flat=True).first()
+        if version is not None:
+            return version
+        return ReferenceVersion.objects.get_or_create(
+            dataset=dataset, defaults={'changed': timezone.now()})[0].changed
+
+    def invalidate(self, dataset):
+        ReferenceVersion.objects.update_or_create(
+            dataset=dataset, defaults={'changed': timezone.now()})
+
+    def get(self, key, version):
+        entry = self._entries.get(key)
+        if entry is None or entry.version != version or (
+                time.monotonic() - entry.created
+                > settings.REFERENCE_CACHE_TIMEOUT):
+            return None
+        return entry
+
+    def set(self, key, version, body):
+        entry = Entry(version, body)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.REFERENCE_CACHE_SIZE:
+                self._entries.popitem(last=False)
+        return entry
+
+
+reference_cache = ReferenceCache()
+
+
+def invalidate_reference(sender, **kwargs):
+    reference_cache.invalidate(DATASETS[sender])
+
+
+def is_not_modified(request, entry):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        return entry.etag in (
+            etag.strip() for etag in if_none_match.split(','))
+    if_modified_since = parse_http_date_safe(
+        request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return (if_modified_since is not None
+            and int(entry.version.timestamp()) <= if_modified_since)
+
+
+class ReferenceCacheMixin:
+    """Отдает list и retrieve справочника из кэша с ETag/Last-Modified."""
+
+    reference_dataset = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, super().retrieve, *args, **kwargs)
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        version = reference_cache.get_version(self.reference_dataset)
+        key = (self.reference_dataset, request.get_full_path())
+        entry = reference_cache.get(key, version)
+        if entry is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = reference_cache.set(
+                key, version, JSONRenderer().render(response.data))
+
+        if is_not_modified(request, entry):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(
+                entry.body, content_type='application/json')
+        response['ETag'] = entry.etag
+        response['Last-Modified'] = http_date(entry.version.timestamp())
+        return response
@@ -0,0 +1,150 @@
+"""Чтение с реплик базы данных.
+
+Безопасные запросы к вьюсетам с ReplicaReadMixin читают с одной из реплик
+settings.DATABASE_REPLICAS, остальные запросы и все записи идут в default.
+После изменяющего запроса пользователь на REPLICA_PIN_SECONDS закрепляется
+за основной базой и видит свои изменения, даже если реплика отстает.
+Реплика, отставшая больше чем на REPLICA_MAX_LAG секунд или недоступная,
+пропускается. Закрепление хранится в кэше, поэтому с репликами нужен
+кэш, общий для всех процессов.
+"""
+
+import logging
+import math
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+PIN_KEY = 'replicas:pin:{}'
+LAG_SQL = {
+    'postgresql': (
+        'SELECT CASE WHEN pg_last_wal_receive_lsn() = '
+        'pg_last_wal_replay_lsn() THEN 0 ELSE EXTRACT(EPOCH FROM '
+        'now() - pg_last_xact_replay_timestamp()) END'),
+}
+
+read_alias = ContextVar('read_alias', default=None)
+
+
+def measure_lag(alias):
+    """Отставание реплики в секундах; бесконечность, если она недоступна.
+
+    Для СУБД без запроса в LAG_SQL отставание считается нулевым.
+    """
+
+    connection = connections[alias]
+    sql = LAG_SQL.get(connection.vendor)
+    if sql is None:
+        return 0
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            lag = cursor.fetchone()[0]
+    except DatabaseError as error:
+        logger.warning(f'Реплика {alias} недоступна: {error}')
+        connection.close()
+        return math.inf
+    return float(lag or 0)
+
+
+class ReplicaLag:
+    """Отставание реплик, измеряемое не чаще раза в
+    REPLICA_LAG_CHECK_INTERVAL секунд на процесс."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._checked = {}
+
+    def get(self, alias):
+        now = time.monotonic()
+        checked = self._checked.get(alias)
+        if checked is None or (
+                now - checked[0] > settings.REPLICA_LAG_CHECK_INTERVAL):
+            checked = (now, measure_lag(alias))
+            with self._lock:
+                self._checked[alias] = checked
+        return checked[1]
+
+
+replica_lag = ReplicaLag()
+
+
+def choose_replica():
+    """Случайная реплика с допустимым отставанием или None."""
+
+    replicas = [alias for alias in settings.DATABASE_REPLICAS
+                if replica_lag.get(alias) <= settings.REPLICA_MAX_LAG]
+    return random.choice(replicas) if replicas else None
+
+
+def check_pin_cache():
+    """Не дает включить реплики с кэшем в памяти процесса: закрепление,
+    сделанное одним воркером, другие воркеры бы не увидели."""
+
+    if settings.DATABASE_REPLICAS and isinstance(
+            caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache)):
+        raise ImproperlyConfigured(
+            'Для DB_REPLICAS нужен общий для процессов кэш (CACHE_BACKEND), '
+            'например Memcached или DatabaseCache.')
+
+
+def pin_to_primary(user):
+    cache.set(PIN_KEY.format(user.id), True, settings.REPLICA_PIN_SECONDS)
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(cache.get(PIN_KEY.format(user.id)))
+
+
+class ReplicaRouter:
+    """Читает с реплики, выбранной для текущего запроса, пишет в default."""
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaReadMixin:
+    """Направляет безопасные запросы вьюсета на реплику, а после
+    изменяющих закрепляет пользователя за основной базой."""
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if (settings.DATABASE_REPLICAS and request.method in SAFE_METHODS
+                and not is_pinned(request.user)):
+            read_alias.set(choose_replica())
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if (settings.DATABASE_REPLICAS and request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and request.user.is_authenticated):
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_alias.set(None)
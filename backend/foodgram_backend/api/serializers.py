@@ -3,14 +3,15 @@ import base64
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 
 from djoser.serializers import UserSerializer
 from rest_framework import serializers
-from rest_framework.validators import UniqueTogetherValidator
 
-from recipes.models import (Favorite, Follow, Ingredient, IngredientRecipe,
-                            Recipe, ShoppingCart, Tag, TagRecipe)
+from recipes.models import (Ingredient, IngredientRecipe, Recipe,
+                            ShoppingListItem, Tag, TagRecipe)
+from recipes.renditions import get_rendition_url
+from recipes.tasks import make_renditions
 
 User = get_user_model()
 
@@ -24,6 +25,28 @@ class Base64ImageField(serializers.ImageField):
         return super().to_internal_value(data)
 
 
+class RenditionField(serializers.Field):
+    """Ссылка на уменьшенную копию картинки рецепта.
+
+    Размер задается аргументом size или ключом image_rendition контекста.
+    """
+
+    def __init__(self, size=None, key='jpeg', **kwargs):
+        self.size = size
+        self.key = key
+        kwargs.setdefault('source', '*')
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        size = self.size or self.context.get('image_rendition', 'large')
+        url = get_rendition_url(recipe, size, self.key)
+        request = self.context.get('request')
+        if url is None or request is None:
+            return url
+        return request.build_absolute_uri(url)
+
+
 class CustomUserSerializer(UserSerializer):
     password = serializers.CharField(
         style={'input_type': 'password'}, write_only=True
@@ -48,6 +71,8 @@ class CustomUserSerializer(UserSerializer):
         return user
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         if self.context.get('request').user.is_authenticated:
             user = (self.context.get('request').user)
             return obj.following.filter(user=user).exists()
@@ -107,6 +132,8 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = IngredientRecipeSerializer(
         source='ingredientrecipe_set', read_only=True, many=True)
     tags = TagSerializer(many=True, read_only=True)
+    image = RenditionField()
+    image_webp = RenditionField(key='webp')
 
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
@@ -114,16 +141,20 @@ class RecipeSerializer(serializers.ModelSerializer):
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time')
+                  'is_in_shopping_cart', 'name', 'image', 'image_webp',
+                  'text', 'cooking_time')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         if self.context.get('request').user.is_authenticated:
             user = (self.context.get('request').user)
             return obj.favorite.filter(user=user).exists()
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         if self.context.get('request').user.is_authenticated:
             user = self.context.get('request').user
             return obj.shopping_cart.filter(user=user).exists()
@@ -138,11 +169,11 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         default=serializers.CurrentUserDefault())
 
     ingredients = IngredientRecipeWriteSerializer(
-        source='ingredientrecipe_set', many=True)
+        source='ingredientrecipe_set', many=True, allow_empty=False)
 
     image = Base64ImageField(required=True, allow_null=False)
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all())
+    tags = serializers.ListField(
+        child=serializers.IntegerField(), allow_empty=False)
     cooking_time = serializers.IntegerField(
         min_value=settings.MIN_VALUE,
         max_value=settings.MAX_VALUE)
@@ -152,112 +183,137 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         fields = ('tags', 'ingredients', 'name', 'image', 'text',
                   'cooking_time', 'author')
 
-    def validate(self, attrs):
-        return super().validate(attrs)
-
-    def add_tags(self, tags, instance):
-        """Метод добавляет связывает теги и рецепт."""
-
-        tags_list = []
-        for tag in tags:
-            tags_list.append(TagRecipe(tag=tag, recipe=instance))
-        TagRecipe.objects.bulk_create(tags_list)
-
-    def add_ingredients(self, ingredients, instance):
-        """Метод связвает ингредиенты и рецепт."""
-
-        ingredients_list = []
-        for ingredient in ingredients:
-            ingredients_list.append(IngredientRecipe(
-                ingredient_id=ingredient.get('ingredient').get('id'),
-                recipe=instance, amount=ingredient.get('amount')))
-        IngredientRecipe.objects.bulk_create(ingredients_list)
+    def validate_tags(self, value):
+        """Проверяет все теги одним запросом."""
 
+        tag_ids = list(dict.fromkeys(value))
+        found = set(Tag.objects.filter(id__in=tag_ids).values_list(
+            'id', flat=True))
+        missing = [str(tag_id) for tag_id in tag_ids if tag_id not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Теги не найдены: {", ".join(missing)}.')
+        return tag_ids
+
+    def validate_ingredients(self, value):
+        """Объединяет повторяющиеся ингредиенты и проверяет все одним
+        запросом. Возвращает словарь {ingredient_id: amount}."""
+
+        amounts = {}
+        for item in value:
+            ingredient_id = item['ingredient']['id']
+            amounts[ingredient_id] = (
+                amounts.get(ingredient_id, 0) + item['amount'])
+        found = set(Ingredient.objects.filter(id__in=amounts).values_list(
+            'id', flat=True))
+        missing = [str(key) for key in amounts if key not in found]
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(missing)}.')
+        if max(amounts.values()) > settings.MAX_VALUE:
+            raise serializers.ValidationError(
+                f'Количество ингредиента не может быть больше '
+                f'{settings.MAX_VALUE}.')
+        return amounts
+
+    def set_tags(self, recipe, tag_ids, current=None):
+        """Приводит теги рецепта к tag_ids: удаляет и добавляет только
+        изменившиеся связи."""
+
+        if current is None:
+            current = set(TagRecipe.objects.filter(
+                recipe=recipe).values_list('tag_id', flat=True))
+        removed = current.difference(tag_ids)
+        if removed:
+            TagRecipe.objects.filter(
+                recipe=recipe, tag_id__in=removed).delete()
+        TagRecipe.objects.bulk_create(
+            [TagRecipe(recipe=recipe, tag_id=tag_id)
+             for tag_id in tag_ids if tag_id not in current])
+
+    def set_ingredients(self, recipe, amounts, current=None):
+        """Приводит состав рецепта к amounts минимальным набором вставок,
+        обновлений и удалений и переносит разницу в списки покупок."""
+
+        if current is None:
+            current = {
+                row.ingredient_id: row for row in
+                IngredientRecipe.objects.filter(recipe=recipe).only(
+                    'id', 'ingredient_id', 'amount')}
+        old_amounts = {key: row.amount for key, row in current.items()}
+        removed = [row.id for key, row in current.items()
+                   if key not in amounts]
+        changed = []
+        for key, row in current.items():
+            if key in amounts and row.amount != amounts[key]:
+                row.amount = amounts[key]
+                changed.append(row)
+        added = [IngredientRecipe(recipe=recipe, ingredient_id=key,
+                                  amount=amount)
+                 for key, amount in amounts.items() if key not in current]
+
+        if removed:
+            IngredientRecipe.objects.filter(id__in=removed).delete()
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ('amount',))
+        IngredientRecipe.objects.bulk_create(added)
+        if current and (removed or changed or added):
+            ShoppingListItem.objects.update_recipe(
+                recipe, old_amounts, amounts)
+
+    @transaction.atomic
     def create(self, validated_data):
         """Метод создания рецепта."""
 
-        ingredients = validated_data.pop('ingredientrecipe_set')
-        tags = validated_data.pop('tags')
+        amounts = validated_data.pop('ingredientrecipe_set')
+        tag_ids = validated_data.pop('tags')
 
         recipe = Recipe.objects.create(**validated_data)
 
-        self.add_ingredients(ingredients, recipe)
-        self.add_tags(tags, recipe)
+        self.set_ingredients(recipe, amounts, current={})
+        self.set_tags(recipe, tag_ids, current=set())
+        make_renditions.enqueue(recipe_id=recipe.id)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
-        """Метод для обновления рецепта."""
-
-        tags = validated_data.pop('tags')
-        ingredients = validated_data.pop('ingredientrecipe_set')
-
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save(update_fields=validated_data)
-
-        TagRecipe.objects.filter(recipe=instance).delete()
-        self.add_tags(tags, instance)
-
-        IngredientRecipe.objects.filter(recipe=instance.id).delete()
-        self.add_ingredients(ingredients, instance)
+        """Метод для обновления рецепта. Поля, которых нет в запросе,
+        не меняются."""
+
+        amounts = validated_data.pop('ingredientrecipe_set', None)
+        tag_ids = validated_data.pop('tags', None)
+
+        if validated_data:
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            instance.save(update_fields=list(validated_data))
+        if tag_ids is not None:
+            self.set_tags(instance, tag_ids)
+        if amounts is not None:
+            self.set_ingredients(instance, amounts)
+        if 'image' in validated_data:
+            make_renditions.enqueue(recipe_id=instance.id)
 
         return instance
 
-
-class CurrentFollowingDefault:
-    """Класс возвращает пользователя на которого подписывается другой."""
-
-    requires_context = True
-
-    def __call__(self, serializer_field):
-        context = serializer_field.context['request'].parser_context
-        return get_object_or_404(User, id=context.get('kwargs').get('id'))
-
-
-class FollowSerializer(serializers.ModelSerializer):
-    """Сериалайзер для подписок."""
-
-    following = serializers.SlugRelatedField(
-        slug_field='username', default=CurrentFollowingDefault(),
-        read_only=True)
-    user = serializers.SlugRelatedField(
-        slug_field='username', default=serializers.CurrentUserDefault(),
-        read_only=True)
-
-    class Meta:
-        model = Follow
-        fields = '__all__'
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Follow.objects.all(),
-                fields=('user', 'following')
-            )
-        ]
-
-    def validate_following(self, value):
-        if not isinstance(value, User):
-            raise serializers.ValidationError('Имя задано неверно.')
-
-        if self.context.get('request').user.id == value.id:
-            raise serializers.ValidationError(
-                'Нельза оформить подписку на себя.')
-
-        return value
-
-    def validate_user(self, value):
-        print(value)
+    def to_representation(self, instance):
+        recipe = Recipe.objects.with_related().with_user_flags(
+            self.context['request'].user).get(pk=instance.pk)
+        return RecipeSerializer(recipe, context=self.context).data
 
 
 class RecipesListSerializer(serializers.ModelSerializer):
+    image = RenditionField('card')
+    image_webp = RenditionField('card', key='webp')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_webp', 'cooking_time')
 
 
 class TempFollowSerializer(CustomUserSerializer):
     recipes = RecipesListSerializer(read_only=True, many=True)
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = User
@@ -266,78 +322,34 @@ class TempFollowSerializer(CustomUserSerializer):
             'is_subscribed', 'recipes', 'recipes_count'
         )
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
-
-class GetRecipe:
-    requires_context = True
-
-    def __call__(self, serializer_field):
-        context = serializer_field.context['request'].parser_context
-        return get_object_or_404(Recipe, id=context.get('kwargs').get('id'))
-
-
-class CurrentRecipeDefault:
-    """Класс возвращает рецепт который добавляется в избранное."""
-
-    requires_context = True
-
-    def __call__(self, serializer_field):
-        context = serializer_field.context['request'].parser_context
-        return get_object_or_404(Recipe, id=context.get('kwargs').get('id'))
 
+class RecipeBatchSerializer(serializers.Serializer):
+    """Пачка рецептов для избранного или корзины: список id или все
+    рецепты автора."""
 
-class FavoriteSerializer(serializers.ModelSerializer):
-    """Сериализатор для избранного."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(), required=False, allow_empty=False,
+        max_length=settings.BATCH_MAX_SIZE)
+    author = serializers.IntegerField(required=False)
 
-    name = serializers.SlugRelatedField(
-        slug_field='name', default=GetRecipe(), read_only=True)
-    id = serializers.ReadOnlyField(source='recipe_id')
-    image = serializers.SerializerMethodField()
-    cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
-    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    recipe = serializers.HiddenField(default=CurrentRecipeDefault())
-
-    class Meta:
-        model = Favorite
-        fields = ('id', 'name', 'image', 'cooking_time', 'user', 'recipe')
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Favorite.objects.all(),
-                fields=('user', 'recipe')
-            )
-        ]
-
-    def get_image(self, obj):
-        request = self.context.get('request')
-        return request.build_absolute_uri(obj.recipe.image)
-
-
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """Сериализатор для продуктовой корзины."""
-
-    name = serializers.SlugRelatedField(
-        slug_field='name', default=GetRecipe(), read_only=True)
-    id = serializers.ReadOnlyField(source='recipe_id')
-    image = serializers.SerializerMethodField(read_only=True)
-    cooking_time = serializers.ReadOnlyField(source='recipe.cooking_time')
-    user = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    recipe = serializers.HiddenField(default=CurrentRecipeDefault())
-
-    class Meta:
-        model = ShoppingCart
-        fields = ('id', 'name', 'image', 'cooking_time', 'user', 'recipe')
-        validators = [
-            UniqueTogetherValidator(
-                queryset=ShoppingCart.objects.all(),
-                fields=('user', 'recipe')
-            )
-        ]
-
-    def get_image(self, obj):
-        request = self.context.get('request')
-        return request.build_absolute_uri(obj.recipe.image)
+    def validate(self, attrs):
+        if ('recipes' in attrs) == ('author' in attrs):
+            raise serializers.ValidationError(
+                'Передайте либо список recipes, либо author.')
+        if 'author' in attrs:
+            attrs['recipes'] = list(Recipe.objects.filter(
+                author_id=attrs['author']).values_list('id', flat=True))
+            return attrs
+
+        recipe_ids = list(dict.fromkeys(attrs['recipes']))
+        found = set(Recipe.objects.filter(id__in=recipe_ids).values_list(
+            'id', flat=True))
+        missing = [str(key) for key in recipe_ids if key not in found]
+        if missing:
+            raise serializers.ValidationError(
+                {'recipes': f'Рецепты не найдены: {", ".join(missing)}.'})
+        attrs['recipes'] = recipe_ids
+        return attrs
 
 
 class ChangePasswordSerializer(serializers.ModelSerializer):
@@ -0,0 +1,43 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from rest_framework.authtoken.models import Token
+
+from api.authentication import (CachedTokenAuthentication, TokenCache,
+                                shared_key, token_cache)
+
+User = get_user_model()
+
+
+@override_settings(TOKEN_CACHE_SHARED=True)
+class SharedTokenCacheTest(TestCase):
+    """Общий уровень кэша токенов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='user', email='user@example.org', password='pass')
+        cls.token = Token.objects.create(user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.invalidate([self.token.key])
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+
+    def test_shared_entry_has_no_user(self):
+        self.assertEqual(cache.get(shared_key(self.token.key)),
+                         (self.user.id, self.token.created))
+
+    def test_other_process_loads_user(self):
+        other = TokenCache()
+        with self.assertNumQueries(1):
+            token = other.get(self.token.key)
+        self.assertEqual(token.user, self.user)
+        self.assertEqual(token.key, self.token.key)
+        with self.assertNumQueries(0):
+            other.get(self.token.key)
+
+    def test_inactive_user_is_not_loaded(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertIsNone(TokenCache().get(self.token.key))
@@ -0,0 +1,34 @@
+from django.test import TestCase
+
+from api.autocomplete import IngredientIndex
+from recipes.models import Ingredient, MeasurementUnit
+
+
+class IngredientIndexTest(TestCase):
+    """Префиксный индекс ингредиентов в памяти процесса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.unit = MeasurementUnit.objects.create(unit_name='г')
+        Ingredient.objects.bulk_create(
+            [Ingredient(name=name, measurement_unit=cls.unit)
+             for name in ('Сахар', 'Соль', 'Морская соль', 'Сода')])
+
+    def names(self, index, query, limit=10):
+        return [item['name'] for item in index.search(query, limit)]
+
+    def test_prefix_matches_go_first(self):
+        index = IngredientIndex()
+        self.assertEqual(self.names(index, 'со'),
+                         ['Сода', 'Соль', 'Морская соль'])
+        self.assertEqual(self.names(index, 'со', limit=1), ['Сода'])
+
+    def test_rebuild_after_invalidate(self):
+        index = IngredientIndex()
+        self.assertEqual(self.names(index, 'сель'), [])
+        Ingredient.objects.create(name='Сельдерей', measurement_unit=self.unit)
+        self.assertEqual(self.names(index, 'сель'), [])
+        index.invalidate()
+        self.assertEqual(self.names(index, 'сель'), ['Сельдерей'])
+        names, items = index._index
+        self.assertEqual(names, [item['name'].lower() for item in items])
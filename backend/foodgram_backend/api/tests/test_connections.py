@@ -0,0 +1,77 @@
+import time
+from unittest import mock
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connection
+from django.test import RequestFactory, TransactionTestCase, override_settings
+
+from api.connections import check_connections, stats
+
+
+class ConnectionReuseTest(TransactionTestCase):
+    """Соединение с базой переживает запрос при CONN_MAX_AGE > 0.
+
+    Тестовый клиент Django не закрывает соединения между запросами,
+    поэтому запросы проходят через WSGIHandler с сигналами
+    request_started и request_finished.
+    """
+
+    def request(self):
+        environ = RequestFactory().get('/api/tags/').environ
+        response = WSGIHandler()(environ, lambda status, headers: None)
+        try:
+            self.assertEqual(response.status_code, 200)
+            return connection.connection
+        finally:
+            response.close()
+
+    def run_requests(self, max_age):
+        connection.close()
+        stats.reset()
+        with mock.patch.dict(connection.settings_dict,
+                             CONN_MAX_AGE=max_age):
+            return self.request(), self.request()
+
+    def test_requests_share_connection(self):
+        first, second = self.run_requests(max_age=60)
+        self.assertIsNotNone(first)
+        self.assertIs(first, second)
+        # На PostgreSQL первый запрос открывает соединение, а второй его
+        # получает. Тестовая база SQLite в памяти не закрывается вовсе.
+        snapshot = stats.snapshot()
+        self.assertGreaterEqual(snapshot['reused'], 1)
+        self.assertEqual(snapshot['opened'] + snapshot['reused'], 2)
+        self.assertEqual(sum(snapshot['wait_buckets']), 2)
+
+    def test_requests_reconnect_without_max_age(self):
+        if connection.vendor == 'sqlite':
+            self.skipTest('SQLite не закрывает тестовую базу в памяти.')
+        first, second = self.run_requests(max_age=0)
+        self.assertIsNot(first, second)
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot['opened'], 2)
+        self.assertEqual(snapshot['reused'], 0)
+
+
+@override_settings(DB_HEALTH_CHECKS=True, DB_HEALTH_CHECK_IDLE=30)
+class HealthCheckTest(TransactionTestCase):
+    """Пингуются только соединения, простоявшие дольше порога."""
+
+    def check(self, idle):
+        connection.ensure_connection()
+        connection.handed_out_at = time.monotonic() - idle
+        with mock.patch.object(connection, 'is_usable',
+                               return_value=True) as is_usable:
+            check_connections()
+        return is_usable.call_count
+
+    def test_recent_connection_is_not_pinged(self):
+        self.assertEqual(self.check(idle=0), 0)
+
+    def test_idle_connection_is_pinged(self):
+        self.assertEqual(self.check(idle=60), 1)
+        self.assertEqual(self.check(idle=0), 0)
+
+    @override_settings(DB_HEALTH_CHECKS=False)
+    def test_disabled(self):
+        self.assertEqual(self.check(idle=60), 0)
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from api import benchmark
+from recipes.models import Favorite, Recipe, RecipeCounterShard
+
+from .test_queries import DATASET
+
+User = get_user_model()
+
+
+@override_settings(COUNTER_SHARDS=4)
+class RecipeCounterTest(TestCase):
+    """Счетчики избранного при шардах и сверке reconcilecounters."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = benchmark.seed(DATASET)
+        cls.recipe = Recipe.objects.create(
+            author=cls.state['bench'], name='Счетчик', text='Описание',
+            image='recipes/images/benchmark.png', cooking_time=5)
+        cls.users = list(User.objects.order_by('id').values_list(
+            'id', flat=True))
+
+    def favorites_count(self):
+        return Recipe.objects.get(pk=self.recipe.pk).favorites_count
+
+    def test_add_and_remove(self):
+        for user_id in self.users:
+            self.assertEqual(
+                Favorite.objects.add(user_id, [self.recipe.pk]), 1)
+        self.assertEqual(Favorite.objects.remove(
+            self.users[0], [self.recipe.pk, self.recipe.pk]), 1)
+        self.assertEqual(
+            Favorite.objects.remove(self.users[0], [self.recipe.pk]), 0)
+
+        RecipeCounterShard.objects.fold()
+        self.assertEqual(self.favorites_count(), len(self.users) - 1)
+        self.assertFalse(RecipeCounterShard.objects.exclude(
+            value=0).exists())
+
+    def test_reconcile_does_not_count_shards_twice(self):
+        for user_id in self.users:
+            Favorite.objects.add(user_id, [self.recipe.pk])
+        self.assertEqual(self.favorites_count(), 0)
+
+        call_command('reconcilecounters')
+        self.assertEqual(self.favorites_count(), len(self.users))
+        RecipeCounterShard.objects.fold()
+        self.assertEqual(self.favorites_count(), len(self.users))
+        call_command('reconcilecounters', verify=True)
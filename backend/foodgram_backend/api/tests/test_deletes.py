@@ -0,0 +1,45 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from api import benchmark
+from recipes.models import Favorite, FeedItem, Recipe
+
+from .test_queries import DATASET
+
+User = get_user_model()
+
+
+class RecipeDeleteTest(TestCase):
+    """Удаление рецепта и связанных строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = benchmark.seed(DATASET)
+
+    def capture_delete(self, recipe):
+        with CaptureQueriesContext(connection) as queries:
+            Recipe.objects.get(pk=recipe.pk).delete()
+        return len(queries)
+
+    def test_cascade_queries_do_not_depend_on_rows(self):
+        """Связанные строки удаляются одним DELETE на таблицу, без
+        выборки по строке."""
+
+        author = self.state['bench']
+        quiet, busy = (
+            Recipe.objects.create(author=author, name=name, text='Описание',
+                                  image='recipes/images/benchmark.png',
+                                  cooking_time=5)
+            for name in ('Без связей', 'Со связями'))
+        users = User.objects.order_by('id')
+        Favorite.objects.bulk_create(
+            [Favorite(user=user, recipe=busy) for user in users])
+        FeedItem.objects.bulk_create(
+            [FeedItem(user=user, recipe=busy, author_id=busy.author_id)
+             for user in users])
+        self.assertEqual(
+            self.capture_delete(quiet), self.capture_delete(busy))
+        self.assertFalse(Favorite.objects.filter(recipe=busy).exists())
+        self.assertFalse(FeedItem.objects.filter(recipe=busy).exists())
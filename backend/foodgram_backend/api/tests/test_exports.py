@@ -0,0 +1,53 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from api import benchmark, exports
+from api.authentication import token_cache
+
+from .test_queries import DATASET
+
+
+class ShoppingListDownloadTest(TestCase):
+    """Выгрузка списка покупок."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = benchmark.seed(DATASET)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.invalidate([self.state['token']])
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.state["token"]}')
+
+    def download(self, file_format):
+        response = self.client.get(
+            f'/api/recipes/download_shopping_cart/?format={file_format}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content)
+        self.assertEqual(int(response['Content-Length']), len(content))
+        return content
+
+    @override_settings(EXPORT_CHUNK_SIZE=16)
+    def test_streamed_in_chunks(self):
+        content = self.download('txt')
+        self.assertGreater(len(content), 16)
+        self.assertEqual(self.download('txt'), content)
+
+    def test_pdf_embeds_cyrillic_font(self):
+        content = self.download('pdf')
+        self.assertTrue(content.startswith(b'%PDF'))
+        self.assertIn(b'DejaVuLGCSans', content)
+
+    @override_settings(FONT_FILE='missing.ttf')
+    def test_missing_font_fails(self):
+        with mock.patch.object(exports, '_font_name', None):
+            with self.assertRaises(ImproperlyConfigured):
+                exports.render_pdf([('соль', 'г', 1)])
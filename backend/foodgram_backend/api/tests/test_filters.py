@@ -0,0 +1,81 @@
+import json
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import RequestFactory, TestCase
+
+from api import benchmark
+from api.filters import RecipeFilter
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+from .test_queries import DATASET
+
+ALL_FILTERS = {'is_favorited': '1', 'is_in_shopping_cart': '1'}
+
+
+def plan_nodes(plan):
+    yield plan
+    for child in plan.get('Plans', ()):
+        yield from plan_nodes(child)
+
+
+class RecipeFilterTest(TestCase):
+    """Фильтры списка рецептов - подзапросы EXISTS без DISTINCT."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = benchmark.seed(DATASET)
+        tagged = Recipe.objects.filter(
+            tags__slug__in=cls.state['tag_slugs']).values_list(
+                'id', flat=True)[:2]
+        for model in (Favorite, ShoppingCart):
+            model.objects.add(cls.state['bench'].id, tagged)
+
+    def filtered(self, **params):
+        request = RequestFactory().get('/api/recipes/', params)
+        request.user = self.state['bench']
+        return RecipeFilter(request.GET, queryset=Recipe.objects.all(),
+                            request=request).qs
+
+    def all_filters(self):
+        return self.filtered(tags=self.state['tag_slugs'], **ALL_FILTERS)
+
+    def test_sql_has_exists_and_no_distinct(self):
+        sql = str(self.all_filters().query).upper()
+        self.assertNotIn('DISTINCT', sql)
+        self.assertEqual(sql.count('EXISTS'), 3)
+
+    def test_results_match_relations(self):
+        user = self.state['bench']
+        expected = set(Recipe.objects.filter(
+            tags__slug__in=self.state['tag_slugs'], favorite__user=user,
+            shopping_cart__user=user).values_list('id', flat=True))
+        result = list(self.all_filters().values_list('id', flat=True))
+        self.assertTrue(expected)
+        self.assertEqual(len(result), len(set(result)))
+        self.assertEqual(set(result), expected)
+
+    def test_zero_does_not_filter(self):
+        self.assertEqual(
+            self.filtered(is_favorited='0', is_in_shopping_cart='0').count(),
+            Recipe.objects.count())
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'План запроса проверяется только на PostgreSQL.')
+    def test_plan_uses_indexes(self):
+        sql, params = self.all_filters().query.sql_with_params()
+        with connection.cursor() as cursor:
+            # На маленьких тестовых таблицах планировщик и так выбрал бы
+            # последовательное чтение; с запретом видно, что индексы есть.
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        nodes = list(plan_nodes(plan[0]['Plan']))
+        node_types = {node['Node Type'] for node in nodes}
+        self.assertNotIn('Seq Scan', node_types)
+        self.assertNotIn('Unique', node_types)
+        self.assertFalse(any(node.get('Strategy') == 'Hashed'
+                             and node['Node Type'] == 'Aggregate'
+                             for node in nodes))
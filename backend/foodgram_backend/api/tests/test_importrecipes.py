@@ -0,0 +1,99 @@
+import json
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from jobs.models import Job
+from recipes.management.commands import importrecipes
+from recipes.models import IngredientRecipe, Recipe, Tag
+from recipes.tasks import make_renditions
+
+User = get_user_model()
+
+IMAGE = 'recipes/images/imported.png'
+
+
+class ImportRecipesTest(TestCase):
+    """Загрузка рецептов командой importrecipes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(username='author', email='a@example.org',
+                                 password='pass')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        override = override_settings(MEDIA_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        default_storage.save(IMAGE, ContentFile(b'image'))
+        # Кэш ссылок живет в процессе, а база откатывается после теста.
+        patcher = mock.patch.object(importrecipes, 'references',
+                                    importrecipes.References())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def load(self, *records):
+        path = self.directory / 'recipes.jsonl'
+        path.write_text(''.join(
+            json.dumps(dict({
+                'author': 'author', 'name': 'Суп', 'text': 'Описание',
+                'cooking_time': 5, 'image': IMAGE,
+                'renditions': {'source': IMAGE}, 'tags': [],
+                'ingredients': [{'name': 'соль', 'measurement_unit': 'г',
+                                 'amount': 1}]}, **record),
+                       ensure_ascii=False) + '\n'
+            for record in records), encoding='utf-8')
+        call_command('importrecipes', str(path))
+
+    def test_repeated_ingredients_are_summed(self):
+        self.load({'ingredients': [
+            {'name': 'соль', 'measurement_unit': 'г', 'amount': 3},
+            {'name': 'соль', 'measurement_unit': 'г', 'amount': 4}]}, {
+            'name': 'Слишком много', 'ingredients': [
+                {'name': 'соль', 'measurement_unit': 'г',
+                 'amount': settings.MAX_VALUE},
+                {'name': 'соль', 'measurement_unit': 'г', 'amount': 1}]})
+        self.assertEqual(list(Recipe.objects.values_list('name', flat=True)),
+                         ['Суп'])
+        self.assertEqual(list(IngredientRecipe.objects.values_list(
+            'amount', flat=True)), [7])
+
+    def test_too_long_tag_is_skipped(self):
+        self.load(
+            {'tags': [{'slug': 'soup', 'name': 'Супы', 'color': '#E26C2D'}]},
+            {'name': 'Длинный slug', 'tags': [{'slug': 's' * 51}]},
+            {'name': 'Длинное имя', 'tags': [{'slug': 'x', 'name': 'x' * 51}]},
+            {'name': 'Длинный цвет',
+             'tags': [{'slug': 'y', 'color': 'y' * 17}]})
+        self.assertEqual(list(Recipe.objects.values_list('name', flat=True)),
+                         ['Суп'])
+        self.assertEqual(list(Tag.objects.values_list('slug', flat=True)),
+                         ['soup'])
+
+    def test_used_image_is_copied(self):
+        self.load({}, {'name': 'Второй суп'})
+        self.load({'name': 'Третий суп'})
+
+        first, *others = Recipe.objects.order_by('id')
+        self.assertEqual(first.image.name, IMAGE)
+        self.assertEqual(first.renditions, {'source': IMAGE})
+        names = {recipe.image.name for recipe in others}
+        self.assertEqual(len(names), 2)
+        self.assertNotIn(IMAGE, names)
+        for recipe in others:
+            self.assertTrue(default_storage.exists(recipe.image.name))
+            self.assertEqual(recipe.renditions, {})
+        self.assertEqual(
+            sorted(Job.objects.filter(task=make_renditions.name).values_list(
+                'payload__recipe_id', flat=True)),
+            sorted(recipe.id for recipe in others))
@@ -0,0 +1,93 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from unittest import skipIf
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from api.metrics import DEAD_FILE, empty_view, fcntl, metrics
+
+User = get_user_model()
+
+VIEW = 'MetricsFilesTest.list'
+
+
+class MetricsAccessTest(TestCase):
+    """/api/metrics закрыт, пока доступ не разрешен явно."""
+
+    def get(self, **extra):
+        return self.client.get('/api/metrics', **extra).status_code
+
+    def test_denied_by_default(self):
+        self.assertEqual(self.get(), 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_token(self):
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong'), 403)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer secret'), 200)
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/8', '127.0.0.1'])
+    def test_allowed_ips(self):
+        self.assertEqual(self.get(), 200)
+        self.assertEqual(self.get(REMOTE_ADDR='10.1.2.3'), 200)
+        self.assertEqual(self.get(REMOTE_ADDR='192.168.0.1'), 403)
+
+    def test_staff(self):
+        user = User.objects.create_user(
+            username='admin', email='admin@example.org', password='pass',
+            is_staff=True)
+        self.client.force_login(user)
+        self.assertEqual(self.get(), 200)
+
+
+@skipIf(fcntl is None, 'Нужен fcntl.')
+class MetricsFilesTest(TestCase):
+    """Файлы завершившихся процессов переносятся в dead.json."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        override = override_settings(METRICS_DIR=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def write(self, pid, requests):
+        view = dict(empty_view(), requests={'200': requests})
+        path = self.directory / f'{pid}.json'
+        path.write_text(json.dumps(
+            {'views': {VIEW: view},
+             'connections': {'opened': requests}}))
+        return path
+
+    def dead_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', ''])
+        process.wait()
+        return process.pid
+
+    def collected_requests(self):
+        return metrics.collect()['views'][VIEW]['requests']['200']
+
+    def test_dead_files_are_folded(self):
+        dead = self.write(self.dead_pid(), 3)
+        alive = self.write(os.getppid(), 5)
+        self.assertEqual(self.collected_requests(), 8)
+        self.assertFalse(dead.exists())
+        self.assertTrue(alive.exists())
+        self.assertTrue((self.directory / DEAD_FILE).exists())
+
+        self.write(self.dead_pid(), 2)
+        self.assertEqual(self.collected_requests(), 10)
+        self.assertEqual(
+            sorted(path.name for path in self.directory.glob('*.json')),
+            sorted([DEAD_FILE, alive.name, f'{os.getpid()}.json']))
+
+    def test_own_pid_file_from_previous_process(self):
+        metrics._reaped = None
+        self.write(os.getpid(), 4)
+        self.assertEqual(self.collected_requests(), 4)
+        self.assertTrue((self.directory / DEAD_FILE).exists())
@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from api import benchmark
+from api.authentication import token_cache
+
+from .test_queries import DATASET
+
+
+class CursorPaginationTest(TestCase):
+    """Курсорный режим списка рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = benchmark.seed(DATASET)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.invalidate([self.state['token']])
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.state["token"]}')
+
+    def test_pages_follow_cursor_ordering(self):
+        response = self.client.get('/api/recipes/?cursor=&limit=2')
+        self.assertEqual(response.status_code, 200)
+        first = [recipe['id'] for recipe in response.data['results']]
+        self.assertEqual(first, sorted(first, reverse=True))
+        response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, 200)
+        self.assertLess(response.data['results'][0]['id'], first[-1])
+
+    def test_cursor_with_ordering_is_rejected(self):
+        for query in ('ordering=-favorites', 'search=суп',
+                      'ordering=favorites'):
+            with self.subTest(query=query):
+                response = self.client.get(f'/api/recipes/?cursor=&{query}')
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('cursor', response.data)
@@ -0,0 +1,84 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+from api import benchmark
+from api.authentication import token_cache
+from recipes.models import Ingredient, IngredientRecipe, Recipe, TagRecipe
+
+DATASET = dict(benchmark.DATASET, users=5, recipes=6, ingredients=40,
+               tags=3, ingredients_per_recipe=3, tags_per_recipe=2,
+               follows=2, favorites=1, cart=1)
+
+
+class RecipeQueryCountTest(TestCase):
+    """Число запросов к списку и рецепту не зависит от числа рецептов,
+    ингридиентов и тегов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = benchmark.seed(DATASET)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.invalidate([self.state['token']])
+        self.anonymous = APIClient()
+        self.authenticated = APIClient()
+        self.authenticated.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.state["token"]}')
+
+    def grow(self, recipes=20):
+        """Добавляет рецепты и ингридиенты в рецепт state['recipe']."""
+
+        author = self.state['bench']
+        Recipe.objects.bulk_create(
+            [Recipe(author=author, name=f'Еще {number}', text='Описание',
+                    image='recipes/images/benchmark.png', cooking_time=5)
+             for number in range(recipes)])
+        ingredients = list(Ingredient.objects.exclude(
+            ingredientrecipe__recipe=self.state['recipe']
+        ).values_list('id', flat=True)[:10])
+        new = Recipe.objects.filter(author=author, name__startswith='Еще')
+        IngredientRecipe.objects.bulk_create(
+            [IngredientRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                              amount=1)
+             for recipe in new for ingredient_id in ingredients[:3]]
+            + [IngredientRecipe(recipe_id=self.state['recipe'],
+                                ingredient_id=ingredient_id, amount=1)
+               for ingredient_id in ingredients])
+        TagRecipe.objects.bulk_create(
+            [TagRecipe(recipe=recipe, tag_id=self.state['tag'])
+             for recipe in new])
+
+    def assert_constant(self, client, path):
+        client.get(path)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(client.get(path).status_code, 200)
+        self.grow()
+        with self.assertNumQueries(len(queries)):
+            response = client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list_anonymous(self):
+        response = self.assert_constant(self.anonymous,
+                                        '/api/recipes/?limit=50')
+        self.assertEqual(len(response.data['results']), 26)
+
+    def test_list_authenticated(self):
+        response = self.assert_constant(self.authenticated,
+                                        '/api/recipes/?limit=50')
+        self.assertEqual(len(response.data['results']), 26)
+
+    def test_detail_anonymous(self):
+        response = self.assert_constant(
+            self.anonymous, f'/api/recipes/{self.state["recipe"]}/')
+        self.assertEqual(len(response.data['ingredients']), 13)
+
+    def test_detail_authenticated(self):
+        response = self.assert_constant(
+            self.authenticated, f'/api/recipes/{self.state["recipe"]}/')
+        self.assertEqual(len(response.data['ingredients']), 13)
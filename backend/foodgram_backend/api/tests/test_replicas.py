@@ -0,0 +1,106 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from rest_framework.test import APIClient
+
+from api import benchmark, replicas
+from api.authentication import token_cache
+from recipes.models import Recipe
+
+from .test_queries import DATASET
+
+# Роль реплики играет сама тестовая база: по алиасу, который вернул
+# роутер, видно, куда ушло чтение (None - в основную базу).
+REPLICA = DEFAULT_DB_ALIAS
+
+
+class ReplicaRouterTest(SimpleTestCase):
+
+    def setUp(self):
+        self.router = replicas.ReplicaRouter()
+
+    def test_write_goes_to_primary(self):
+        token = replicas.read_alias.set('replica1')
+        try:
+            self.assertEqual(self.router.db_for_write(Recipe),
+                             DEFAULT_DB_ALIAS)
+            self.assertEqual(self.router.db_for_read(Recipe), 'replica1')
+        finally:
+            replicas.read_alias.reset(token)
+        self.assertIsNone(self.router.db_for_read(Recipe))
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_replicas_are_not_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica1', 'recipes'))
+        self.assertIsNone(self.router.allow_migrate('default', 'recipes'))
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_process_cache_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            replicas.check_pin_cache()
+
+    @override_settings(DATABASE_REPLICAS=['replica1'], CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'cache_table'}})
+    def test_shared_cache_is_accepted(self):
+        replicas.check_pin_cache()
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA])
+class ReplicaReadTest(TestCase):
+    """Выбор базы для чтения в ReplicaReadMixin."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.state = benchmark.seed(DATASET)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.invalidate([self.state['token']])
+        self.client = APIClient()
+        self.client.credentials(
+            HTTP_AUTHORIZATION=f'Token {self.state["token"]}')
+
+    def read_aliases(self, lag, method, path):
+        """Алиасы, которые роутер вернул для чтения рецептов за время
+        запроса. Токен проверяется до выбора реплики, в основной базе."""
+
+        aliases = []
+        db_for_read = replicas.ReplicaRouter.db_for_read
+
+        def record(router, model, **hints):
+            alias = db_for_read(router, model, **hints)
+            if model is Recipe:
+                aliases.append(alias)
+            return alias
+
+        with mock.patch.object(replicas.ReplicaRouter, 'db_for_read',
+                               record), mock.patch.object(
+                replicas.replica_lag, 'get', return_value=lag):
+            response = getattr(self.client, method)(path)
+        self.assertLess(response.status_code, 400)
+        return set(aliases)
+
+    def test_safe_request_reads_from_replica(self):
+        self.assertEqual(self.read_aliases(0, 'get', '/api/recipes/'),
+                         {REPLICA})
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        self.assertEqual(self.read_aliases(60, 'get', '/api/recipes/'),
+                         {None})
+
+    def test_write_pins_user_to_primary(self):
+        recipe = self.state['free_recipe']
+        self.assertNotIn(REPLICA, self.read_aliases(
+            0, 'post', f'/api/recipes/{recipe}/favorite/'))
+        self.assertTrue(replicas.is_pinned(self.state['bench']))
+        self.assertEqual(self.read_aliases(0, 'get', '/api/recipes/'),
+                         {None})
+
+        cache.clear()
+        self.assertEqual(self.read_aliases(0, 'get', '/api/recipes/'),
+                         {REPLICA})
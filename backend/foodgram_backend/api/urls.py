@@ -1,7 +1,8 @@
-from django.urls import include, path
+from django.urls import include, path, re_path
 
 from rest_framework import routers
 
+from .metrics import metrics_view
 from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewset
 
 router_v1 = routers.DefaultRouter()
@@ -14,4 +15,5 @@ router_v1.register('recipes', RecipeViewSet, basename='recipes')
 urlpatterns = [
     path('', include(router_v1.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    re_path(r'^metrics/?$', metrics_view, name='metrics'),
 ]
@@ -1,31 +1,30 @@
-import io
-
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import FileResponse
+from django.db.models import (BooleanField, Prefetch, Value,
+                              prefetch_related_objects)
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from django_filters.rest_framework import DjangoFilterBackend
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
 from rest_framework import filters, mixins, permissions, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.response import Response
 
-from recipes.models import (Favorite, Follow, Ingredient, IngredientRecipe,
-                            Recipe, ShoppingCart, Tag)
+from recipes.models import (Favorite, Follow, Ingredient, Recipe, ShoppingCart,
+                            Tag)
 
+from . import exports
+from .authentication import token_cache
+from .autocomplete import autocomplete
 from .filters import RecipeFilter
-from .pagination import CustomPagination
+from .pagination import CustomPagination, KeysetPagination
+from .reference_cache import ReferenceCacheMixin
+from .replicas import ReplicaReadMixin
 from .serializers import (ChangePasswordSerializer, CustomUserSerializer,
-                          FavoriteSerializer, FollowSerializer,
-                          IngredientSerializer, RecipeSerializer,
-                          RecipeWriteSerializer, ShoppingCartSerializer,
-                          TagSerializer, TempFollowSerializer)
+                          IngredientSerializer, RecipeBatchSerializer,
+                          RecipeSerializer, RecipesListSerializer,
+                          RecipeWriteSerializer, TagSerializer,
+                          TempFollowSerializer)
 
 User = get_user_model()
 
@@ -37,33 +36,29 @@ class CreateViewset(mixins.CreateModelMixin, viewsets.GenericViewSet):
 class ExtraActoinsViewset(viewsets.ModelViewSet):
     """Базовый вьюест для обработки дополнительных эндпоинтов."""
 
-    def extra_exctions(self, request, model, **kwargs):
-        print(request.method)
+    def extra_exctions(self, request, model, target, serializer_class):
+        """Идемпотентно добавляет (POST) или удаляет (DELETE) связь
+        пользователя с target одним запросом: повтор не ошибка."""
+
         if request.method == 'DELETE':
-            item = get_object_or_404(model, **kwargs)
-            item.delete()
+            model.objects.remove(request.user.id, (target.id,))
             return Response(status=status.HTTP_204_NO_CONTENT)
-        if request.method == 'POST':
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
 
-            item = model.objects.create(**kwargs)
-            print(item)
-            print(serializer)
-            serializer = self.get_serializer(
-                item, many=False, context={'request': request})
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        created = model.objects.add(request.user.id, (target.id,))
+        serializer = serializer_class(
+            target, context=self.get_serializer_context())
+        return Response(serializer.data, status=(
+            status.HTTP_201_CREATED if created else status.HTTP_200_OK))
 
-        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-
-class UserViewset(ExtraActoinsViewset):
+class UserViewset(ReplicaReadMixin, ExtraActoinsViewset):
     """Вьюсет для создания пользователя."""
 
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = CustomPagination
+    cursor_ordering = 'username'
 
     @action(detail=False, methods=['GET'])
     def me(self, request):
@@ -85,15 +80,36 @@ class UserViewset(ExtraActoinsViewset):
         user.set_password(
             serializer.validated_data.get('new_password'))
         user.save(update_fields=['password'])
+        token_cache.invalidate_user(user.id)
         msg = {'results': ['Пароль успешно изменен.']}
         return Response(msg, status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=False, methods=['DELETE', 'POST'],
             url_path=r'(?P<id>\d+)/subscribe',
-            serializer_class=FollowSerializer)
+            permission_classes=(permissions.IsAuthenticated,))
     def subscribe(self, request, id):
+        if request.method == 'DELETE':
+            author = get_object_or_404(User.objects.only('id'), id=id)
+            return self.extra_exctions(
+                request, Follow, author, TempFollowSerializer)
+
+        author = get_object_or_404(User, id=id)
+        if author.id == request.user.id:
+            msg = {'errors': ['Нельзя подписаться на себя.']}
+            return Response(msg, status=status.HTTP_400_BAD_REQUEST)
+        author.is_subscribed = True
+        prefetch_related_objects([author], Prefetch(
+            'recipes', queryset=Recipe.objects.latest_per_author(
+                (author.id,), self.get_recipes_limit(request))))
         return self.extra_exctions(
-            request, Follow, user=request.user, following_id=id)
+            request, Follow, author, TempFollowSerializer)
+
+    def get_recipes_limit(self, request):
+        try:
+            limit = int(request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            return None
+        return max(limit, 0)
 
     @action(detail=False, methods=['GET'])
     def subscriptions(self, request):
@@ -101,101 +117,180 @@ class UserViewset(ExtraActoinsViewset):
             response = {'detail': 'Учетные данные не были предоставлены.'}
             return Response(response, status=status.HTTP_401_UNAUTHORIZED)
 
-        subs = User.objects.filter(following__user=request.user)
+        subs = User.objects.filter(following__user=request.user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('username')
         page = self.paginate_queryset(subs)
+        prefetch_related_objects(page, Prefetch(
+            'recipes', queryset=Recipe.objects.latest_per_author(
+                [user.id for user in page],
+                self.get_recipes_limit(request))))
         serializer = TempFollowSerializer(page, many=True,
                                           context={'request': request})
 
         return self.get_paginated_response(serializer.data)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReplicaReadMixin, ReferenceCacheMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Вьюсет для ингридиентов."""
 
-    queryset = Ingredient.objects.all()
+    queryset = Ingredient.objects.select_related('measurement_unit')
     serializer_class = IngredientSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
+    reference_dataset = 'ingredients'
     filter_backends = (filters.SearchFilter,)
     search_fields = ('^name',)
 
-
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['GET'])
+    def autocomplete(self, request):
+        query = request.query_params.get('name', '').strip()
+        if not query:
+            return Response([])
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.AUTOCOMPLETE_LIMIT))
+        except ValueError:
+            limit = settings.AUTOCOMPLETE_LIMIT
+        limit = min(max(limit, 1), settings.AUTOCOMPLETE_MAX_LIMIT)
+        return Response(autocomplete(query, limit))
+
+
+class TagViewSet(ReplicaReadMixin, ReferenceCacheMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тегов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (permissions.AllowAny,)
     pagination_class = None
+    reference_dataset = 'tags'
 
 
-class RecipeViewSet(ExtraActoinsViewset):
+class RecipeViewSet(ReplicaReadMixin, ExtraActoinsViewset):
     """Вьюсет рецептов."""
 
     serializer_class = RecipeSerializer
     permission_classes = (permissions.IsAuthenticatedOrReadOnly,)
+    pagination_class = CustomPagination
+    cursor_ordering = '-id'
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    read_actions = ('list', 'retrieve', 'trending', 'feed')
+    card_actions = ('list', 'trending', 'feed')
 
     def get_queryset(self):
+        if self.action in self.read_actions:
+            return Recipe.objects.with_related().with_user_flags(
+                self.request.user)
         return Recipe.objects.all()
 
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['image_rendition'] = (
+            'card' if self.action in self.card_actions else 'large')
+        return context
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_content_negotiation(self, request, force=False):
+        if self.action == 'download_shopping_cart':
+            force = True
+        return super().perform_content_negotiation(request, force)
+
     def get_serializer_class(self):
-        if (self.action == 'list') or (self.action == 'retrieve'):
+        if self.action in self.read_actions:
             return RecipeSerializer
 
-        if self.action == 'favorite':
-            return FavoriteSerializer
+        return RecipeWriteSerializer
 
-        if self.action == 'shopping_cart':
-            return ShoppingCartSerializer
+    def get_toggle_target(self, id):
+        return get_object_or_404(Recipe.objects.only(
+            'id', 'name', 'image', 'renditions', 'cooking_time'), id=id)
 
-        return RecipeWriteSerializer
+    def extra_batch(self, request, model):
+        """Добавляет или удаляет пачку рецептов одним запросом."""
+
+        serializer = RecipeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        if request.method == 'DELETE':
+            removed = model.objects.remove(request.user.id, recipe_ids)
+            return Response({'recipes': recipe_ids, 'removed': removed})
+        added = model.objects.add(request.user.id, recipe_ids)
+        return Response({'recipes': recipe_ids, 'added': added},
+                        status=status.HTTP_201_CREATED if added
+                        else status.HTTP_200_OK)
 
     @action(detail=False, methods=['DELETE', 'POST'],
-            url_path=r'(?P<id>\d+)/favorite',
-            serializer_class=FavoriteSerializer)
+            url_path=r'(?P<id>\d+)/favorite')
     def favorite(self, request, id):
         return self.extra_exctions(
-            request, Favorite, user=request.user, recipe_id=id)
+            request, Favorite, self.get_toggle_target(id),
+            RecipesListSerializer)
+
+    @action(detail=False, methods=['DELETE', 'POST'], url_path='favorite',
+            permission_classes=(permissions.IsAuthenticated,))
+    def favorite_batch(self, request):
+        return self.extra_batch(request, Favorite)
 
     @action(detail=False, methods=['DELETE', 'POST'],
-            url_path=r'(?P<id>\d+)/shopping_cart',
-            serializer_class=ShoppingCartSerializer)
+            url_path=r'(?P<id>\d+)/shopping_cart')
     def shopping_cart(self, request, id):
-        self.extra_exctions(
-            request, ShoppingCart, user=request.user, recipe_id=id)
+        return self.extra_exctions(
+            request, ShoppingCart, self.get_toggle_target(id),
+            RecipesListSerializer)
+
+    @action(detail=False, methods=['DELETE', 'POST'],
+            url_path='shopping_cart',
+            permission_classes=(permissions.IsAuthenticated,))
+    def shopping_cart_batch(self, request):
+        return self.extra_batch(request, ShoppingCart)
 
     @action(detail=False, methods=['GET'])
+    def trending(self, request):
+        """Рецепты, популярные в последнее время, по рейтингу, который
+        обновляет команда computetrending. Фильтры те же, что у списка."""
+
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.TRENDING_LIMIT))
+        except ValueError:
+            limit = settings.TRENDING_LIMIT
+        limit = min(max(limit, 1), settings.TRENDING_MAX_LIMIT)
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            trending__isnull=False).order_by('-trending__score')
+        serializer = self.get_serializer(queryset[:limit], many=True)
+        return Response(serializer.data)
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=(permissions.IsAuthenticated,))
+    def feed(self, request):
+        """Новые рецепты авторов из подписок, постранично по курсору."""
+
+        paginator = KeysetPagination()
+        queryset = self.filter_queryset(
+            self.get_queryset().feed(request.user))
+        page = paginator.paginate_queryset(queryset, request, self)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['GET'],
+            permission_classes=(permissions.IsAuthenticated,))
     def download_shopping_cart(self, request):
-        recipe_ids = ShoppingCart.objects.filter(
-            user=request.user).values_list('recipe_id', flat=True)
-        qs = IngredientRecipe.objects.filter(recipe_id__in=recipe_ids)
-
-        ingredients = qs.values(
-            'ingredient__name',
-            'ingredient__measurement_unit__unit_name').annotate(
-                total=Sum('amount'))
-
-        buffer = io.BytesIO()
-        pdf_canvas = canvas.Canvas(buffer, pagesize=A4, bottomup=0)
-        text_obj = pdf_canvas.beginText()
-        text_obj.setTextOrigin(cm, cm)
-        pdfmetrics.registerFont(TTFont('DejaVuLGCSans', 'DejaVuLGCSans.ttf'))
-        text_obj.setFont('DejaVuLGCSans', settings.FONT_SIZE)
-
-        for ingredient in ingredients:
-            text_obj.textLines(
-                f'{ingredient.get("ingredient__name")}'
-                f' {ingredient.get("total")}'
-                f'{ingredient.get("ingredient__measurement_unit__unit_name")}')
-
-        pdf_canvas.drawText(text_obj)
-        pdf_canvas.showPage()
-        pdf_canvas.save()
-        buffer.seek(0)
-        return FileResponse(buffer, as_attachment=True,
-                            filename='shopping_cart.pdf')
+        file_format = request.query_params.get('format', 'pdf')
+        if file_format not in exports.FORMATS:
+            msg = {'format': [f'Доступные форматы: '
+                              f'{", ".join(exports.FORMATS)}.']}
+            return Response(msg, status=status.HTTP_400_BAD_REQUEST)
+
+        document = exports.get_shopping_list(request.user, file_format)
+        _, content_type = exports.FORMATS[file_format]
+        response = StreamingHttpResponse(
+            exports.iter_chunks(document), content_type=content_type)
+        response['Content-Length'] = len(document)
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_cart.{file_format}"')
+        return response
@@ -33,6 +33,7 @@ THIRD_PRT_APPS = [
 
 LOCAL_APPS = [
     'api',
+    'jobs',
     'recipes',
     'users',
 ]
@@ -40,6 +41,7 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PRT_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -80,10 +82,32 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', default='postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', default='postgres'),
         'HOST': os.getenv('DB_HOST', default='db'),
-        'PORT': os.getenv('DB_PORT', default='5432')
+        'PORT': os.getenv('DB_PORT', default='5432'),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', default=60)),
+        'DISABLE_SERVER_SIDE_CURSORS': os.getenv(
+            'DB_PGBOUNCER', default='false').lower() == 'true',
     }
 }
 
+# Проверка открытых соединений (api.connections), не настройка Django.
+DB_HEALTH_CHECKS = os.getenv(
+    'DB_HEALTH_CHECKS', default='true').lower() == 'true'
+DB_HEALTH_CHECK_IDLE = int(os.getenv('DB_HEALTH_CHECK_IDLE', default=30))
+
+DATABASE_REPLICAS = []
+for number, location in enumerate(
+        os.getenv('DB_REPLICAS', default='').split(), start=1):
+    replica = dict(DATABASES['default'], TEST={'MIRROR': 'default'})
+    if replica['ENGINE'].endswith('sqlite3'):
+        replica['NAME'] = location
+    else:
+        host, _, port = location.partition(':')
+        replica.update(HOST=host, PORT=port or replica['PORT'])
+    DATABASES[f'replica{number}'] = replica
+    DATABASE_REPLICAS.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['api.replicas.ReplicaRouter']
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -116,6 +140,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static-backend')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+TEST_RUNNER = 'foodgram_backend.test_runner.TemporaryMediaRunner'
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
@@ -128,7 +154,7 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
         # 'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
@@ -136,9 +162,73 @@ DJOSER = {
     "LOGIN_FIELD": "email"
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+    }
+}
+
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_URLS_REGEX = r'^/api/.*$'
 
 MIN_VALUE = 1
 MAX_VALUE = 32000
 FONT_SIZE = 14
+FONT_NAME = 'DejaVuLGCSans'
+# В репозитории шрифт лежит в infra/fonts, в контейнере он смонтирован
+# в /usr/share/fonts, где reportlab находит его по имени файла.
+BUNDLED_FONT = BASE_DIR.parent.parent / 'infra' / 'fonts' / 'DejaVuLGCSans.ttf'
+FONT_FILE = os.getenv('FONT_FILE', default=str(
+    BUNDLED_FONT if BUNDLED_FONT.exists() else 'DejaVuLGCSans.ttf'))
+SHOPPING_LIST_CACHE_TIMEOUT = 60 * 60
+EXPORT_CHUNK_SIZE = 64 * 1024
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_MAX_LIMIT = 50
+AUTOCOMPLETE_INDEX_TIMEOUT = 5 * 60
+REFERENCE_CACHE_TIMEOUT = 5 * 60
+REFERENCE_CACHE_SIZE = 256
+BATCH_MAX_SIZE = 500
+COUNTER_SHARDS = int(os.getenv('COUNTER_SHARDS', default=0))
+COUNTER_FOLD_INTERVAL = 10
+TRENDING_HALF_LIFE = 24 * 60 * 60
+TRENDING_WINDOW = 7 * 24 * 60 * 60
+TRENDING_LIMIT = 20
+TRENDING_MAX_LIMIT = 100
+FEED_FANOUT_LIMIT = 10000
+FEED_BACKFILL = 50
+FEED_BATCH_SIZE = 1000
+TOKEN_CACHE_SIZE = 10000
+TOKEN_CACHE_TIMEOUT = 60
+TOKEN_CACHE_SHARED = os.getenv(
+    'TOKEN_CACHE_SHARED', default='false').lower() == 'true'
+METRICS_DIR = os.getenv('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = 5
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONNECTION_WAIT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                           0.1, 0.25, 0.5, 1)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', default='').split()
+REPLICA_PIN_SECONDS = 10
+REPLICA_MAX_LAG = 5
+REPLICA_LAG_CHECK_INTERVAL = 5
+ASGI_URLCONF = 'foodgram_backend.urls_asgi'
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', default=8))
+ASGI_BLOCKING_THREADS = int(os.getenv('ASGI_BLOCKING_THREADS', default=2))
+IMAGE_RENDITIONS = {
+    'card': '480x320',
+    'large': '1280x960',
+}
+IMAGE_RENDITION_QUALITY = 80
+
+JOB_WORKER_PROCESSES = int(os.getenv('JOB_WORKER_PROCESSES', default=1))
+JOB_WORKER_THREADS = int(os.getenv('JOB_WORKER_THREADS', default=2))
+JOB_POLL_INTERVAL = 1.0
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 10
+JOB_RETRY_MAX_DELAY = 60 * 60
+JOB_TIMEOUT = 10 * 60
+JOB_RETENTION = 7 * 24 * 60 * 60
+JOB_STATS_WINDOW = 60 * 60
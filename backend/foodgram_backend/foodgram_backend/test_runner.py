@@ -0,0 +1,21 @@
+import tempfile
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TemporaryMediaRunner(DiscoverRunner):
+    """Запускает тесты с MEDIA_ROOT во временном каталоге, чтобы
+    загруженные в тестах файлы не попадали в media/ проекта."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.media_root = tempfile.TemporaryDirectory()
+        self.media_override = override_settings(
+            MEDIA_ROOT=self.media_root.name)
+        self.media_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.media_override.disable()
+        self.media_root.cleanup()
+        super().teardown_test_environment(**kwargs)
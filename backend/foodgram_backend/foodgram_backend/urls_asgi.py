@@ -0,0 +1,14 @@
+"""Маршруты для запуска под ASGI: API обслуживают асинхронные
+представления из api.async_views, остальное совпадает с urls.py."""
+
+from django.urls import include, path
+
+from api import urls as api_urls
+from api.async_views import offload_patterns
+
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/', include(offload_patterns(api_urls.urlpatterns))),
+    *sync_urlpatterns,
+]
@@ -0,0 +1,20 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'task', 'status', 'attempts', 'created',
+                    'started', 'finished', 'worker')
+    list_filter = ('status', 'task')
+    search_fields = ('task',)
+    readonly_fields = ('created', 'started', 'finished', 'worker', 'error')
+    actions = ('retry',)
+
+    @admin.action(description='Перезапустить')
+    def retry(self, request, queryset):
+        queryset.exclude(status=Job.RUNNING).update(
+            status=Job.QUEUED, attempts=0, run_after=timezone.now(),
+            error='')
@@ -0,0 +1,84 @@
+import logging
+import multiprocessing
+import signal
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connections
+
+from jobs.models import Job
+from jobs.worker import Worker
+
+logger = logging.getLogger('jobs')
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(processName)s/%(threadName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+def run_worker(options, stop_event):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    Worker(options['threads'], options['poll_interval'], options['burst'],
+           stop_event).run()
+
+
+class Command(BaseCommand):
+    help = ('Запускает воркер фоновых задач: --processes процессов '
+            'по --threads потоков.')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--processes', type=int,
+                            default=settings.JOB_WORKER_PROCESSES)
+        parser.add_argument('--threads', type=int,
+                            default=settings.JOB_WORKER_THREADS)
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.JOB_POLL_INTERVAL)
+        parser.add_argument('--burst', action='store_true',
+                            help='Выполнить готовые задачи и завершиться.')
+        parser.add_argument('--stats', action='store_true',
+                            help='Показать статистику очереди.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+
+        stop_event = multiprocessing.Event()
+
+        def stop(signum, frame):
+            logger.info('Завершаем работу после текущих задач...')
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        logger.info(f'Воркер запущен: процессов {options["processes"]}, '
+                    f'потоков {options["threads"]}.')
+        if options['processes'] <= 1:
+            Worker(options['threads'], options['poll_interval'],
+                   options['burst'], stop_event).run()
+            return
+
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=run_worker,
+                                    args=(options, stop_event))
+            for _ in range(options['processes'])]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+
+    def print_stats(self):
+        stats = Job.objects.stats()
+        for status, count in stats.pop('counts').items():
+            self.stdout.write(f'{status:<10}{count:>10}')
+        for key, value in stats.items():
+            if value is None:
+                value = '-'
+            elif hasattr(value, 'total_seconds'):
+                value = f'{value.total_seconds() * 1000:.0f} мс'
+            self.stdout.write(f'{key:<10}{value:>10}')
@@ -0,0 +1,142 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import (Avg, Count, DurationField, ExpressionWrapper, F,
+                              Max, Min, Q)
+from django.utils import timezone
+
+
+def duration(end, start):
+    return ExpressionWrapper(F(end) - F(start), output_field=DurationField())
+
+
+class JobQuerySet(models.QuerySet):
+    """Очередь задач в таблице базы данных."""
+
+    def claim(self, worker, limit=1):
+        """Атомарно забирает до limit готовых к запуску задач.
+
+        На PostgreSQL строки блокируются SELECT ... FOR UPDATE SKIP LOCKED,
+        поэтому воркеры не ждут друг друга. На SQLite запись в базу
+        и так сериализована: задача достается тому воркеру, чей условный
+        UPDATE изменил строку.
+        """
+
+        now = timezone.now()
+        ready = self.filter(status=Job.QUEUED, run_after__lte=now).order_by(
+            'run_after', 'id')
+        claimed = {'status': Job.RUNNING, 'started': now, 'finished': None,
+                   'worker': worker, 'attempts': F('attempts') + 1}
+        with transaction.atomic(using=self.db):
+            features = connections[self.db].features
+            if features.has_select_for_update_skip_locked:
+                locked = ready.select_for_update(skip_locked=True)
+                ids = list(locked.values_list('id', flat=True)[:limit])
+                self.filter(id__in=ids).update(**claimed)
+            else:
+                ids = [
+                    job_id for job_id in
+                    ready.values_list('id', flat=True)[:limit]
+                    if self.filter(id=job_id, status=Job.QUEUED).update(
+                        **claimed)]
+        if not ids:
+            return []
+        return list(self.filter(id__in=ids).order_by('run_after', 'id'))
+
+    def requeue_stale(self):
+        """Возвращает в очередь задачи воркеров, которые перестали
+        отвечать дольше JOB_TIMEOUT, и удаляет старые выполненные."""
+
+        now = timezone.now()
+        stale = self.filter(
+            status=Job.RUNNING,
+            started__lt=now - timedelta(seconds=settings.JOB_TIMEOUT))
+        failed = stale.filter(attempts__gte=F('max_attempts')).update(
+            status=Job.FAILED, finished=now, error='Превышено время работы.')
+        requeued = stale.update(status=Job.QUEUED, run_after=now)
+        self.filter(
+            status=Job.DONE,
+            finished__lt=now - timedelta(seconds=settings.JOB_RETENTION)
+        ).delete()
+        return requeued + failed
+
+    def stats(self, window=None):
+        """Число задач по статусам и задержки за последние window секунд."""
+
+        now = timezone.now()
+        window = timedelta(seconds=window or settings.JOB_STATS_WINDOW)
+        counts = dict(self.order_by().values_list('status').annotate(
+            Count('id')))
+        oldest = self.filter(
+            status=Job.QUEUED, run_after__lte=now).aggregate(
+                oldest=Min('run_after'))['oldest']
+        latency = self.filter(
+            status__in=(Job.DONE, Job.FAILED), finished__gte=now - window
+        ).aggregate(
+            wait_avg=Avg(duration('started', 'run_after')),
+            wait_max=Max(duration('started', 'run_after')),
+            run_avg=Avg(duration('finished', 'started')),
+            run_max=Max(duration('finished', 'started')),
+            done=Count('id', filter=Q(status=Job.DONE)),
+            failed=Count('id', filter=Q(status=Job.FAILED)))
+        return {
+            'counts': {status: counts.get(status, 0)
+                       for status, _ in Job.STATUSES},
+            'queue_lag': now - oldest if oldest else timedelta(),
+            **latency,
+        }
+
+
+class Job(models.Model):
+    """Фоновая задача."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    task = models.CharField(verbose_name='Задача', max_length=150)
+    payload = models.JSONField(
+        verbose_name='Аргументы', default=dict, blank=True)
+    status = models.CharField(
+        verbose_name='Статус', max_length=10, choices=STATUSES,
+        default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(
+        verbose_name='Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток', default=5)
+    run_after = models.DateTimeField(
+        verbose_name='Запустить после', default=timezone.now)
+    created = models.DateTimeField(
+        verbose_name='Создана', default=timezone.now)
+    started = models.DateTimeField(
+        verbose_name='Запущена', null=True, blank=True)
+    finished = models.DateTimeField(
+        verbose_name='Завершена', null=True, blank=True)
+    worker = models.CharField(
+        verbose_name='Воркер', max_length=100, blank=True)
+    error = models.TextField(verbose_name='Ошибка', blank=True)
+
+    objects = JobQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ['-id']
+        indexes = [
+            models.Index(
+                fields=('run_after', 'id'), name='job_queued_idx',
+                condition=Q(status='queued')),
+            models.Index(fields=('status', 'finished'),
+                         name='job_status_finished_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.id}: {self.task} ({self.status})'
@@ -0,0 +1,96 @@
+"""Регистрация фоновых задач, постановка в очередь и выполнение."""
+
+import logging
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+registry = {}
+
+
+class Task:
+    """Функция, которую можно выполнить в воркере: task.enqueue(**kwargs).
+
+    Аргументы сохраняются в JSON, поэтому передавать нужно id объектов,
+    а не сами объекты.
+    """
+
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, **kwargs):
+        return self.func(**kwargs)
+
+    def enqueue(self, delay=0, **kwargs):
+        """Ставит задачу в очередь в текущей транзакции: если транзакция
+        откатится, задача тоже не будет создана."""
+
+        return Job.objects.create(
+            task=self.name, payload=kwargs, max_attempts=self.max_attempts,
+            run_after=timezone.now() + timedelta(seconds=delay))
+
+
+def task(func=None, *, name=None, max_attempts=None):
+    """Декоратор, регистрирующий функцию как фоновую задачу."""
+
+    def register(func):
+        registered = Task(
+            func, name or f'{func.__module__}.{func.__name__}',
+            max_attempts or settings.JOB_MAX_ATTEMPTS)
+        registry[registered.name] = registered
+        return registered
+
+    if func is None:
+        return register
+    return register(func)
+
+
+def get_retry_delay(attempts):
+    """Экспоненциальная задержка перед повтором: 1x, 2x, 4x ..."""
+
+    return min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1),
+               settings.JOB_RETRY_MAX_DELAY)
+
+
+def run_job(job):
+    """Выполняет захваченную задачу и записывает результат."""
+
+    started = time.monotonic()
+    try:
+        registered = registry.get(job.task)
+        if registered is None:
+            raise LookupError(f'Задача {job.task} не зарегистрирована.')
+        registered(**job.payload)
+    except Exception:
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts < job.max_attempts:
+            delay = get_retry_delay(job.attempts)
+            Job.objects.filter(id=job.id).update(
+                status=Job.QUEUED, error=error,
+                run_after=now + timedelta(seconds=delay))
+            logger.warning(f'Задача {job} завершилась с ошибкой, повтор '
+                           f'через {delay} с:\n{error}')
+        else:
+            Job.objects.filter(id=job.id).update(
+                status=Job.FAILED, error=error, finished=now)
+            logger.error(f'Задача {job} завершилась с ошибкой после '
+                         f'{job.attempts} попыток:\n{error}')
+        return False
+
+    Job.objects.filter(id=job.id).update(
+        status=Job.DONE, error='', finished=timezone.now())
+    wait = (job.started - job.run_after).total_seconds()
+    logger.info(f'Задача {job} выполнена за '
+                f'{(time.monotonic() - started) * 1000:.0f} мс, '
+                f'ожидала {wait * 1000:.0f} мс.')
+    return True
@@ -0,0 +1,63 @@
+"""Цикл воркера: потоки внутри процесса забирают задачи из очереди."""
+
+import logging
+import os
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+
+from .models import Job
+from .queue import run_job
+
+logger = logging.getLogger(__name__)
+
+
+class Worker:
+
+    def __init__(self, threads=1, poll_interval=None, burst=False,
+                 stop_event=None):
+        self.threads = threads
+        self.poll_interval = poll_interval or settings.JOB_POLL_INTERVAL
+        self.burst = burst
+        self.stop_event = stop_event or threading.Event()
+
+    def run(self):
+        with ThreadPoolExecutor(self.threads) as pool:
+            for future in [pool.submit(self.loop)
+                           for _ in range(self.threads)]:
+                future.result()
+
+    def loop(self):
+        name = (f'{socket.gethostname()}:{os.getpid()}:'
+                f'{threading.get_ident()}')
+        try:
+            while not self.stop_event.is_set():
+                claimed = self.step(name)
+                if claimed:
+                    continue
+                if claimed is not None and self.burst:
+                    return
+                self.stop_event.wait(self.poll_interval)
+        finally:
+            connection.close()
+
+    def step(self, name):
+        """Забирает и выполняет одну задачу.
+
+        False - очередь пуста, None - база недоступна или заблокирована.
+        """
+
+        try:
+            jobs = Job.objects.claim(name)
+            if not jobs:
+                Job.objects.requeue_stale()
+        except DatabaseError as error:
+            logger.warning(f'Не удалось получить задачу: {error}')
+            connection.close()
+            return None
+        for job in jobs:
+            run_job(job)
+        return bool(jobs)
@@ -1,25 +1,138 @@
 from django.contrib import admin
+from django.utils.functional import cached_property
+
+from api.pagination import EstimatedCountPaginator, estimate_count
+
+from .models import (COUNTERS, Favorite, Follow, Ingredient, IngredientRecipe,
+                     Recipe, ShoppingCart, ShoppingListItem, Tag, TagRecipe,
+                     recount)
+from .tasks import make_renditions
+
+
+class EstimatedAdminPaginator(EstimatedCountPaginator):
+    """Пагинатор списков админки без COUNT(*) по всей таблице.
+
+    Небольшие количества считаются точно (COUNT по выборке с LIMIT):
+    заниженная оценка не должна превратить список в одну страницу со
+    всеми строками.
+    """
+
+    exact_limit = 1000
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate > self.exact_limit:
+            return estimate
+        return self.object_list.order_by()[:self.exact_limit + 1].count()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Админка таблиц, которые вырастают до миллионов строк."""
+
+    paginator = EstimatedAdminPaginator
+    show_full_result_count = False
+
+
+class CounterAdmin(LargeTableAdmin):
+    """Модели, от которых зависят денормализованные счетчики: после правки
+    в админке счетчики затронутых объектов пересчитываются."""
+
+    def recount(self, objs, initial=None):
+        for source, fk, field in COUNTERS:
+            if source is self.model:
+                ids = {getattr(obj, f'{fk}_id') for obj in objs}
+                if initial and initial.get(fk):
+                    ids.add(initial[fk])
+                recount(source, fk, field, ids)
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        self.recount([obj], form.initial)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.recount([obj])
+
+    def delete_queryset(self, request, queryset):
+        objs = list(queryset)
+        super().delete_queryset(request, queryset)
+        self.recount(objs)
 
-from .models import (Favorite, Follow, Ingredient, IngredientRecipe, Recipe,
-                     ShoppingCart, Tag, TagRecipe)
 
 admin.site.register(Tag)
-admin.site.register(TagRecipe)
-admin.site.register(IngredientRecipe)
-admin.site.register(Follow)
-admin.site.register(Favorite)
-admin.site.register(ShoppingCart)
+
+
+@admin.register(TagRecipe)
+class TagRecipeAdmin(LargeTableAdmin):
+    list_display = ('id', 'recipe', 'tag')
+    list_select_related = ('recipe', 'tag')
+    raw_id_fields = ('recipe',)
+
+
+@admin.register(IngredientRecipe)
+class IngredientRecipeAdmin(LargeTableAdmin):
+    list_display = ('id', 'recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    raw_id_fields = ('recipe', 'ingredient')
+
+    def save_model(self, request, obj, form, change):
+        if change:
+            old = IngredientRecipe.objects.get(pk=obj.pk)
+            ShoppingListItem.objects.update_recipe(
+                old.recipe_id, {old.ingredient_id: old.amount}, {})
+        super().save_model(request, obj, form, change)
+        ShoppingListItem.objects.update_recipe(
+            obj.recipe_id, {}, {obj.ingredient_id: obj.amount})
+
+    def delete_model(self, request, obj):
+        ShoppingListItem.objects.update_recipe(
+            obj.recipe_id, {obj.ingredient_id: obj.amount}, {})
+        super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            ShoppingListItem.objects.update_recipe(
+                obj.recipe_id, {obj.ingredient_id: obj.amount}, {})
+        super().delete_queryset(request, queryset)
+
+
+@admin.register(Follow)
+class FollowAdmin(CounterAdmin):
+    list_display = ('id', 'user', 'following')
+    list_select_related = ('user', 'following')
+    raw_id_fields = ('user', 'following')
+
+
+@admin.register(Favorite)
+class UserRecipeAdmin(CounterAdmin):
+    list_display = ('id', 'user', 'recipe', 'created')
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
+
+
+@admin.register(ShoppingCart)
+class ShoppingCartAdmin(UserRecipeAdmin):
+    """Одиночные правки переносит в список покупок сама модель, после
+    удаления пачкой списки затронутых пользователей пересобираются."""
+
+    def delete_queryset(self, request, queryset):
+        user_ids = set(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        ShoppingListItem.objects.rebuild(user_ids)
 
 
 class RecipeIngredientInline(admin.TabularInline):
     model = Recipe.ingredients.through
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     list_display = ('id', 'name', 'meas_unit')
-    list_filter = ('name',)
+    list_select_related = ('measurement_unit',)
+    search_fields = ('^name',)
 
     def meas_unit(self, obj):
         return obj.measurement_unit.unit_name
@@ -27,14 +140,29 @@ class IngredientAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(CounterAdmin):
     list_display = (
         'id', 'author', 'name', 'image', 'text',
-        'cooking_time', 'favorite_count')
-    search_fields = ('name',)
-    list_filter = ('tags', 'name', 'author')
+        'cooking_time', 'favorites_count', 'in_carts_count')
+    list_select_related = ('author',)
+    search_fields = ('name', '=author__username')
+    list_filter = ('tags',)
+    raw_id_fields = ('author',)
     inlines = (RecipeIngredientInline,)
 
-    def favorite_count(self, obj):
-        return obj.favorite.count()
-    favorite_count.short_description = 'В избранных'
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        if 'image' in form.changed_data:
+            make_renditions.enqueue(recipe_id=obj.id)
+
+    def save_related(self, request, form, formsets, change):
+        """Переносит правку ингридиентов во вкладке рецепта в корзины."""
+
+        amounts = IngredientRecipe.objects.filter(
+            recipe=form.instance).values_list('ingredient_id', 'amount')
+        old_amounts = dict(amounts) if change else {}
+        super().save_related(request, form, formsets, change)
+        new_amounts = dict(amounts.all())
+        if change and new_amounts != old_amounts:
+            ShoppingListItem.objects.update_recipe(
+                form.instance, old_amounts, new_amounts)
@@ -4,3 +4,21 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from django.contrib.auth import get_user_model
+        from django.db.models.signals import post_delete, post_save, pre_delete
+
+        from . import counters, shopping_lists
+        from .models import Recipe, RecipeCounterShard
+        from .signals import counter_shards_changed
+        from .tasks import delete_recipe_files, recipe_created, schedule_fold
+
+        post_delete.connect(delete_recipe_files, sender=Recipe)
+        post_save.connect(recipe_created, sender=Recipe)
+        post_save.connect(counters.recipe_saved, sender=Recipe)
+        post_delete.connect(counters.recipe_deleted, sender=Recipe)
+        pre_delete.connect(counters.user_deleting, sender=get_user_model())
+        pre_delete.connect(shopping_lists.recipe_deleting, sender=Recipe)
+        counter_shards_changed.connect(
+            schedule_fold, sender=RecipeCounterShard)
@@ -0,0 +1,31 @@
+"""Обработчики сигналов, поддерживающие денормализованные счетчики.
+
+Избранное, корзина и подписки меняют счетчики сами (см.
+UserRelationQuerySet), здесь обрабатываются создание и удаление рецептов
+и каскадное удаление связей вместе с пользователем.
+"""
+
+from .models import COUNTERS, Recipe, update_counter
+
+
+def recipe_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        update_counter(
+            Recipe, 'author', 'recipes_count', (instance.author_id,), 1)
+
+
+def recipe_deleted(sender, instance, **kwargs):
+    update_counter(
+        Recipe, 'author', 'recipes_count', (instance.author_id,), -1)
+
+
+def user_deleting(sender, instance, **kwargs):
+    """Вычитает из счетчиков связи пользователя до того, как они будут
+    удалены каскадом в обход менеджеров."""
+
+    for source, fk, field in COUNTERS:
+        if source is not Recipe:
+            ids = list(source.objects.filter(user=instance).values_list(
+                f'{fk}_id', flat=True))
+            if ids:
+                update_counter(source, fk, field, ids, -1)
@@ -0,0 +1,32 @@
+import logging
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from recipes.trending import update_trending
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = ('Обновляет рейтинг популярных рецептов по новым добавлениям '
+            'в избранное и корзины. Запускайте периодически, например '
+            'из cron раз в несколько минут.')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Пересчитать рейтинг с нуля.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        updated = update_trending(rebuild=options.get('rebuild'))
+        logger.debug(f'Рейтинг обновлен для {updated} рецептов за '
+                     f'{time.monotonic() - started:.2f} с.')
@@ -0,0 +1,106 @@
+import gzip
+import json
+import logging
+import sys
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.core.management.base import (BaseCommand, CommandError,
+                                         CommandParser)
+
+from recipes.models import IngredientRecipe, Recipe, Tag, TagRecipe
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stderr)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+RECIPE_FIELDS = ('id', 'author__username', 'name', 'text', 'cooking_time',
+                 'image', 'renditions')
+
+
+def open_output(path):
+    if str(path) == '-':
+        return sys.stdout
+    if path.suffix == '.gz':
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+def relations(recipe_ids, tags):
+    """Теги и ингридиенты пачки рецептов: два запроса на пачку."""
+
+    recipe_tags = {}
+    for recipe_id, tag_id in TagRecipe.objects.filter(
+            recipe_id__in=recipe_ids).order_by().values_list(
+                'recipe_id', 'tag_id'):
+        recipe_tags.setdefault(recipe_id, []).append(tags[tag_id])
+    ingredients = {}
+    for recipe_id, name, unit, amount in IngredientRecipe.objects.filter(
+            recipe_id__in=recipe_ids).order_by('id').values_list(
+                'recipe_id', 'ingredient__name',
+                'ingredient__measurement_unit__unit_name', 'amount'):
+        ingredients.setdefault(recipe_id, []).append(
+            {'name': name, 'measurement_unit': unit, 'amount': amount})
+    return recipe_tags, ingredients
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты с тегами, ингридиентами и ссылками на '
+            'картинки в формате JSON Lines: один рецепт на строку. '
+            'Файлы картинок не выгружаются, их нужно скопировать отдельно '
+            'из MEDIA_ROOT. Файл .gz сжимается, "-" - вывод в stdout.')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size < 1:
+            raise CommandError('--chunk-size должен быть больше нуля.')
+        tags = {
+            tag['id']: {'slug': tag['slug'], 'name': tag['name'],
+                        'color': tag['color']}
+            for tag in Tag.objects.values('id', 'slug', 'name', 'color')}
+        # На PostgreSQL iterator() читает через серверный курсор, память
+        # не растет с размером таблицы.
+        rows = Recipe.objects.order_by('id').values_list(
+            *RECIPE_FIELDS).iterator(chunk_size=chunk_size)
+
+        started = time.monotonic()
+        total = 0
+        output = open_output(options['path'])
+        try:
+            while True:
+                chunk = list(islice(rows, chunk_size))
+                if not chunk:
+                    break
+                recipe_tags, ingredients = relations(
+                    [row[0] for row in chunk], tags)
+                for (recipe_id, author, name, text, cooking_time, image,
+                     renditions) in chunk:
+                    output.write(json.dumps({
+                        'author': author,
+                        'name': name,
+                        'text': text,
+                        'cooking_time': cooking_time,
+                        'image': image,
+                        'renditions': renditions,
+                        'tags': recipe_tags.get(recipe_id, []),
+                        'ingredients': ingredients.get(recipe_id, []),
+                    }, ensure_ascii=False) + '\n')
+                total += len(chunk)
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        elapsed = time.monotonic() - started
+        logger.debug(
+            f'Выгружено рецептов: {total}, '
+            f'{total / elapsed if elapsed else total:.0f} рецептов/с.')
@@ -1,10 +1,18 @@
+import json
 import logging
 import sys
+import time
 from csv import reader
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand, CommandParser
+from django.conf import settings
+from django.core.management.base import (BaseCommand, CommandError,
+                                         CommandParser)
+from django.db import transaction
 
 from recipes.models import Ingredient, MeasurementUnit
+from recipes.signals import reference_data_changed
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -15,42 +23,149 @@ formatter = logging.Formatter(
 logger.addHandler(handler)
 handler.setFormatter(formatter)
 
+DEFAULT_PATHS = (
+    Path(settings.BASE_DIR) / 'data' / 'ingredients.csv',
+    Path(settings.BASE_DIR).parent.parent / 'data' / 'ingredients.csv',
+)
+READ_SIZE = 64 * 1024
+NAME_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_LENGTH = MeasurementUnit._meta.get_field('unit_name').max_length
+
 
 def clear_table(table):
     table.objects.all().delete()
     logger.debug(f'Таблица {table.__name__} очищена.')
 
 
+def read_csv(file):
+    for row in reader(file, delimiter=','):
+        yield row[:2] if len(row) >= 2 else None
+
+
+def skip_separators(buffer, position):
+    while position < len(buffer) and buffer[position] in ' \t\r\n,':
+        position += 1
+    return position
+
+
+def read_json(file):
+    """Читает JSON-массив объектов по одному, не загружая файл целиком."""
+
+    decoder = json.JSONDecoder()
+    buffer = file.read(READ_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается JSON-массив.')
+    position = 1
+    while True:
+        position = skip_separators(buffer, position)
+        if buffer[position:position + 1] == ']':
+            return
+        try:
+            item, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_SIZE)
+            if not chunk:
+                raise CommandError('JSON-файл обрезан или поврежден.')
+            buffer = buffer[position:] + chunk
+            position = 0
+            continue
+        if isinstance(item, dict):
+            yield [item.get('name'), item.get('measurement_unit')]
+        else:
+            yield None
+
+
+READERS = {'.csv': read_csv, '.json': read_json}
+
+
 class Command(BaseCommand):
     help = 'Используйте эту команду для заполнения таблицы с ингридиентами.'
 
     def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', nargs='?', type=Path)
         parser.add_argument('-c', '--clear', action='store_true')
+        parser.add_argument('--format', choices=('csv', 'json'))
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true')
 
-    def handle(self, *args, **options):
-        logger.debug('Начинаем импорт...')
-        if options.get('clear'):
-            logger.debug('Очищаем таблицы.')
-            clear_table(Ingredient)
-            clear_table(MeasurementUnit)
-
-        csv_file_path = './data/ingredients.csv'
-        with open(csv_file_path, newline='') as csvfile:
-            spamreader = reader(csvfile, delimiter=',')
-            list_ingredients = []
-            i = 0
-            for row in spamreader:
-                try:
-                    i += 1
-                    measurement_unit, _ = (
-                        MeasurementUnit.objects.get_or_create(
-                            unit_name=row[1]))
-                    list_ingredients.append(
-                        Ingredient(name=row[0],
-                                   measurement_unit=measurement_unit))
-                except IndexError as error:
-                    logger.error(exc_info=error)
+    def rows(self, path, read, report=True):
+        """Отдает проверенные строки (название, единица измерения)."""
+
+        with open(path, newline='', encoding='utf-8') as file:
+            for number, row in enumerate(read(file), start=1):
+                if (row is None or not all(isinstance(value, str) and value
+                                           for value in row)):
+                    if report:
+                        logger.error(f'Строка {number} пропущена: {row}')
+                    continue
+                name, unit = (value.strip() for value in row)
+                if len(name) > NAME_LENGTH or len(unit) > UNIT_LENGTH:
+                    if report:
+                        logger.error(
+                            f'Строка {number} слишком длинная: {row}')
                     continue
-            logger.debug('Список ингридиентов создан.')
-            Ingredient.objects.bulk_create(list_ingredients)
-            logger.debug('Ингридиенты успешно добавлены.')
+                yield name, unit
+
+    def get_path(self, path):
+        """Путь из аргумента или файл из data/ рядом с проектом либо
+        в корне репозитория."""
+
+        if path is None:
+            path = next((default for default in DEFAULT_PATHS
+                         if default.is_file()), DEFAULT_PATHS[0])
+        if not path.is_file():
+            raise CommandError(f'Файл не найден: {path}')
+        return path
+
+    def handle(self, *args, **options):
+        path = self.get_path(options['path'])
+        suffix = f'.{options["format"]}' if options.get('format') else (
+            path.suffix.lower())
+        read = READERS.get(suffix)
+        if read is None:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size должен быть больше нуля.')
+
+        logger.debug(f'Начинаем импорт из {path}...')
+        started = time.monotonic()
+        with transaction.atomic():
+            if options.get('clear'):
+                logger.debug('Очищаем таблицы.')
+                clear_table(Ingredient)
+                clear_table(MeasurementUnit)
+            before = Ingredient.objects.count()
+
+            MeasurementUnit.objects.bulk_create(
+                [MeasurementUnit(unit_name=unit_name) for unit_name in
+                 {unit for _, unit in self.rows(path, read, report=False)}],
+                ignore_conflicts=True)
+            units = dict(MeasurementUnit.objects.values_list(
+                'unit_name', 'id'))
+            logger.debug(f'Единиц измерения: {len(units)}.')
+
+            total = 0
+            rows = self.rows(path, read)
+            while True:
+                batch = [
+                    Ingredient(name=name, measurement_unit_id=units[unit])
+                    for name, unit in islice(rows, batch_size)]
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+
+            created = Ingredient.objects.count() - before
+            if options.get('dry_run'):
+                transaction.set_rollback(True)
+
+        elapsed = time.monotonic() - started
+        logger.debug(
+            f'Прочитано строк: {total}, новых ингридиентов: {created}, '
+            f'{total / elapsed if elapsed else total:.0f} строк/с.')
+        if options.get('dry_run'):
+            logger.debug('Пробный запуск: изменения отменены.')
+            return
+        reference_data_changed.send(sender=Ingredient)
+        logger.debug('Ингридиенты успешно добавлены.')
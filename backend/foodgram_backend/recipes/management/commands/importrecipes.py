@@ -0,0 +1,403 @@
+import gzip
+import json
+import logging
+import multiprocessing
+import sys
+import time
+from collections import deque
+from itertools import islice
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import (BaseCommand, CommandError,
+                                         CommandParser)
+from django.db import connections, router, transaction
+
+from recipes.models import (UPDATE_BATCH_SIZE, Ingredient, IngredientRecipe,
+                            MeasurementUnit, Recipe, Tag, TagRecipe, recount)
+from recipes.signals import reference_data_changed
+from recipes.tasks import make_renditions
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+User = get_user_model()
+
+NAME_LENGTH = Recipe._meta.get_field('name').max_length
+INGREDIENT_LENGTH = Ingredient._meta.get_field('name').max_length
+UNIT_LENGTH = MeasurementUnit._meta.get_field('unit_name').max_length
+TAG_NAME_LENGTH = Tag._meta.get_field('name').max_length
+TAG_SLUG_LENGTH = Tag._meta.get_field('slug').max_length
+TAG_COLOR_LENGTH = Tag._meta.get_field('color').max_length
+REFERENCE_MODELS = {model.__name__: model
+                    for model in (Tag, Ingredient, MeasurementUnit)}
+PROGRESS_INTERVAL = 5
+
+
+def check(condition, message):
+    if not condition:
+        raise ValueError(message)
+
+
+def in_range(value):
+    return (isinstance(value, int)
+            and settings.MIN_VALUE <= value <= settings.MAX_VALUE)
+
+
+def parse_tags(tags):
+    check(isinstance(tags, list), 'tags должен быть списком')
+    result = {}
+    for tag in tags:
+        check(isinstance(tag.get('slug'), str) and tag['slug'],
+              'у тега нет slug')
+        check(len(tag['slug']) <= TAG_SLUG_LENGTH
+              and len(str(tag.get('name') or tag['slug'])) <= TAG_NAME_LENGTH
+              and len(str(tag.get('color') or '')) <= TAG_COLOR_LENGTH,
+              'недопустимый тег')
+        result.setdefault(tag['slug'], tag)
+    return list(result.values())
+
+
+def parse_ingredients(ingredients):
+    check(isinstance(ingredients, list) and ingredients,
+          'нет ингридиентов')
+    result = {}
+    for item in ingredients:
+        name = item['name'].strip()
+        unit = item['measurement_unit'].strip()
+        check(0 < len(name) <= INGREDIENT_LENGTH
+              and 0 < len(unit) <= UNIT_LENGTH,
+              'недопустимое название ингридиента')
+        check(in_range(item['amount']), 'недопустимое количество')
+        result[name, unit] = result.get((name, unit), 0) + item['amount']
+    check(max(result.values()) <= settings.MAX_VALUE,
+          'недопустимое количество')
+    return result
+
+
+def parse(line):
+    """Проверенный рецепт из строки файла; ValueError, если он неверен."""
+
+    try:
+        record = json.loads(line)
+        check(isinstance(record.get('author'), str), 'нет автора')
+        check(isinstance(record.get('name'), str)
+              and 0 < len(record['name']) <= NAME_LENGTH,
+              'недопустимое название')
+        check(isinstance(record.get('text'), str), 'нет описания')
+        check(in_range(record.get('cooking_time')),
+              'недопустимое время приготовления')
+        check(isinstance(record.get('image'), str) and record['image'],
+              'нет картинки')
+        check(isinstance(record.get('renditions', {}), dict),
+              'renditions должен быть объектом')
+        record['tags'] = parse_tags(record.get('tags', []))
+        record['ingredients'] = parse_ingredients(record.get('ingredients'))
+    except (AttributeError, KeyError, TypeError) as error:
+        raise ValueError(f'неверная структура: {error!r}')
+    return record
+
+
+class References:
+    """Идентификаторы тегов, ингридиентов и авторов по их естественным
+    ключам. Кэш свой у каждого процесса; недостающие теги, единицы
+    измерения и ингридиенты создаются (повторная вставка из соседнего
+    процесса не ошибка), авторы - нет."""
+
+    def __init__(self):
+        self.tags = {}
+        self.units = {}
+        self.ingredients = {}
+        self.authors = {}
+        self.created = set()
+
+    def create(self, model, objs):
+        if objs:
+            model.objects.bulk_create(objs, ignore_conflicts=True)
+            self.created.add(model.__name__)
+
+    def resolve_tags(self, tags):
+        missing = {tag['slug']: tag for tag in tags
+                   if tag['slug'] not in self.tags}
+        if not missing:
+            return
+        self.tags.update(Tag.objects.filter(
+            slug__in=missing).values_list('slug', 'id'))
+        self.create(Tag, [
+            Tag(slug=slug, name=str(tag.get('name') or slug),
+                color=str(tag.get('color') or ''))
+            for slug, tag in missing.items() if slug not in self.tags])
+        self.tags.update(Tag.objects.filter(
+            slug__in=missing).values_list('slug', 'id'))
+
+    def resolve_units(self, units):
+        missing = set(units) - set(self.units)
+        if not missing:
+            return
+        self.units.update(MeasurementUnit.objects.filter(
+            unit_name__in=missing).values_list('unit_name', 'id'))
+        self.create(MeasurementUnit, [
+            MeasurementUnit(unit_name=unit) for unit in missing
+            if unit not in self.units])
+        self.units.update(MeasurementUnit.objects.filter(
+            unit_name__in=missing).values_list('unit_name', 'id'))
+
+    def fetch_ingredients(self, keys):
+        for name, unit, ingredient_id in Ingredient.objects.filter(
+                name__in={name for name, _ in keys}).values_list(
+                    'name', 'measurement_unit__unit_name', 'id'):
+            if (name, unit) in keys:
+                self.ingredients[name, unit] = ingredient_id
+
+    def resolve_ingredients(self, keys):
+        missing = set(keys) - set(self.ingredients)
+        if not missing:
+            return
+        self.resolve_units({unit for _, unit in missing})
+        self.fetch_ingredients(missing)
+        self.create(Ingredient, [
+            Ingredient(name=name, measurement_unit_id=self.units[unit])
+            for name, unit in missing if (name, unit) not in self.ingredients])
+        self.fetch_ingredients(missing)
+
+    def resolve_authors(self, usernames):
+        missing = set(usernames) - set(self.authors)
+        if missing:
+            self.authors.update(User.objects.filter(
+                username__in=missing).values_list('username', 'id'))
+
+
+references = References()
+
+
+def parse_chunk(first_line, lines):
+    records = []
+    for number, line in enumerate(lines, start=first_line):
+        if not line.strip():
+            continue
+        try:
+            records.append(parse(line))
+        except ValueError as error:
+            logger.error(f'Строка {number} пропущена: {error}')
+    return records
+
+
+def insert_recipes(recipes):
+    """bulk_create с получением id; там, где СУБД не возвращает id из
+    пакетной вставки (SQLite в Django 3.2), рецепты вставляются по одному
+    без сигналов post_save."""
+
+    using = router.db_for_write(Recipe)
+    if connections[using].features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes)
+        return
+    fields = [field for field in Recipe._meta.concrete_fields
+              if not field.primary_key]
+    for recipe in recipes:
+        recipe.pk = Recipe.objects._insert(
+            [recipe], fields, returning_fields=[Recipe._meta.pk],
+            using=using)[0][0]
+
+
+def build_recipes(records, default_author):
+    """Пары (запись, несохраненный рецепт); рецепты авторов, которых нет
+    в базе, достаются default_author или пропускаются."""
+
+    recipes = []
+    unknown = set()
+    for record in records:
+        author_id = references.authors.get(
+            record['author'], references.authors.get(default_author))
+        if author_id is None:
+            unknown.add(record['author'])
+            continue
+        recipes.append((record, Recipe(
+            author_id=author_id, name=record['name'], text=record['text'],
+            cooking_time=record['cooking_time'], image=record['image'],
+            renditions=record.get('renditions', {}))))
+    if unknown:
+        logger.error(f'Пропущено рецептов: {len(records) - len(recipes)}, '
+                     f'нет пользователей: {", ".join(sorted(unknown))}.')
+    return recipes
+
+
+def copy_used_images(recipes):
+    """Рецепты, чья картинка уже занята другим рецептом (например, файл
+    загружается повторно), получают свою копию файла: иначе удаление
+    одного рецепта удалило бы картинку другого. Копии уменьшенных
+    картинок строятся заново. Возвращает оставшиеся пары и рецепты
+    с копиями."""
+
+    used = set(Recipe.objects.filter(
+        image__in={recipe.image.name for _, recipe in recipes}
+    ).values_list('image', flat=True))
+    result = []
+    copied = []
+    for record, recipe in recipes:
+        name = recipe.image.name
+        if name in used:
+            try:
+                with default_storage.open(name) as source:
+                    recipe.image = default_storage.save(name, source)
+            except OSError as error:
+                logger.error(f'Рецепт "{recipe.name}" пропущен: картинка '
+                             f'{name} уже занята, а файл недоступен: '
+                             f'{error}')
+                continue
+            recipe.renditions = {}
+            copied.append(recipe)
+        used.add(name)
+        result.append((record, recipe))
+    return result, copied
+
+
+def import_chunk(first_line, lines, default_author=None):
+    """Импортирует пачку строк файла в одной транзакции."""
+
+    records = parse_chunk(first_line, lines)
+    with transaction.atomic(using=router.db_for_write(Recipe)):
+        references.resolve_authors(
+            {record['author'] for record in records} | {default_author}
+            - {None})
+        references.resolve_tags(
+            [tag for record in records for tag in record['tags']])
+        references.resolve_ingredients(
+            {key for record in records for key in record['ingredients']})
+        recipes, copied = copy_used_images(
+            build_recipes(records, default_author))
+        insert_recipes([recipe for _, recipe in recipes])
+        for recipe in copied:
+            make_renditions.enqueue(recipe_id=recipe.id)
+        TagRecipe.objects.bulk_create([
+            TagRecipe(recipe_id=recipe.id,
+                      tag_id=references.tags[tag['slug']])
+            for record, recipe in recipes for tag in record['tags']])
+        IngredientRecipe.objects.bulk_create([
+            IngredientRecipe(recipe_id=recipe.id,
+                             ingredient_id=references.ingredients[key],
+                             amount=amount)
+            for record, recipe in recipes
+            for key, amount in record['ingredients'].items()])
+    return {'lines': len(lines), 'recipes': len(recipes),
+            'authors': {recipe.author_id for _, recipe in recipes},
+            'created': set(references.created)}
+
+
+def open_input(path):
+    if str(path) == '-':
+        return sys.stdin
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def read_chunks(file, chunk_size):
+    """Пары (номер первой строки, строки) по chunk_size строк."""
+
+    first_line = 1
+    while True:
+        lines = list(islice(file, chunk_size))
+        if not lines:
+            return
+        yield first_line, lines
+        first_line += len(lines)
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из файла JSON Lines, выгруженного командой '
+            'exportrecipes. Теги, единицы измерения и ингридиенты, которых '
+            'нет в базе, создаются; авторы ищутся по username. Пачки по '
+            '--chunk-size строк загружаются каждая в своей транзакции '
+            'в --workers процессах. Ленты подписок не обновляются: после '
+            'загрузки запустите rebuildfeeds.')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('path', type=Path)
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--workers', type=int, default=1)
+        parser.add_argument(
+            '--author',
+            help='Автор рецептов, чьих авторов нет в базе; без него такие '
+                 'рецепты пропускаются.')
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError(
+                '--chunk-size и --workers должны быть больше нуля.')
+        workers = options['workers']
+        if (workers > 1
+                and connections[router.db_for_write(Recipe)].vendor
+                == 'sqlite'):
+            logger.warning('SQLite не допускает параллельной записи, '
+                           'загружаем в одном процессе.')
+            workers = 1
+
+        self.started = self.reported = time.monotonic()
+        self.totals = {'lines': 0, 'recipes': 0, 'authors': set(),
+                       'created': set()}
+        file = open_input(options['path'])
+        try:
+            chunks = read_chunks(file, options['chunk_size'])
+            if workers == 1:
+                for first_line, lines in chunks:
+                    self.add(import_chunk(
+                        first_line, lines, options['author']))
+            else:
+                self.run_pool(chunks, workers, options['author'])
+        finally:
+            if file is not sys.stdin:
+                file.close()
+        self.finish()
+
+    def run_pool(self, chunks, workers, default_author):
+        """Раздает пачки процессам, держа в очереди не больше двух пачек
+        на процесс, чтобы файл не читался в память целиком."""
+
+        connections.close_all()
+        pending = deque()
+        with multiprocessing.Pool(workers) as pool:
+            for first_line, lines in chunks:
+                if len(pending) >= 2 * workers:
+                    self.add(pending.popleft().get())
+                pending.append(pool.apply_async(
+                    import_chunk, (first_line, lines, default_author)))
+            while pending:
+                self.add(pending.popleft().get())
+            pool.close()
+            pool.join()
+
+    def add(self, result):
+        for key in ('lines', 'recipes'):
+            self.totals[key] += result[key]
+        for key in ('authors', 'created'):
+            self.totals[key] |= result[key]
+        now = time.monotonic()
+        if now - self.reported >= PROGRESS_INTERVAL:
+            self.reported = now
+            logger.debug(
+                f'Загружено рецептов: {self.totals["recipes"]}, '
+                f'{self.totals["recipes"] / (now - self.started):.0f} '
+                f'рецептов/с.')
+
+    def finish(self):
+        authors = list(self.totals['authors'])
+        for start in range(0, len(authors), UPDATE_BATCH_SIZE):
+            recount(Recipe, 'author', 'recipes_count',
+                    authors[start:start + UPDATE_BATCH_SIZE])
+        for name in self.totals['created']:
+            reference_data_changed.send(sender=REFERENCE_MODELS[name])
+
+        elapsed = time.monotonic() - self.started
+        recipes = self.totals['recipes']
+        logger.debug(
+            f'Прочитано строк: {self.totals["lines"]}, загружено рецептов: '
+            f'{recipes}, пропущено: {self.totals["lines"] - recipes}, '
+            f'{recipes / elapsed if elapsed else recipes:.0f} рецептов/с.')
@@ -0,0 +1,40 @@
+import logging
+import sys
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from recipes.models import Recipe
+from recipes.renditions import make_renditions
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = ('Создает уменьшенные копии картинок рецептов, у которых их нет '
+            'или они устарели (--force - для всех рецептов).')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--force', action='store_true')
+
+    def handle(self, *args, **options):
+        created = failed = 0
+        for recipe in Recipe.objects.only('id', 'image', 'renditions'):
+            if not recipe.image or not options.get('force') and (
+                    recipe.renditions.get('source') == recipe.image.name):
+                continue
+            try:
+                make_renditions(recipe)
+            except Exception as error:
+                failed += 1
+                logger.error(f'Рецепт {recipe.id}: {error}')
+                continue
+            created += 1
+        logger.debug(f'Копии созданы для {created} рецептов, '
+                     f'ошибок: {failed}.')
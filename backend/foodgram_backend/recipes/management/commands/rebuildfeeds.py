@@ -0,0 +1,44 @@
+import logging
+import sys
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from recipes.models import FeedItem, Follow
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = ('Заново заполняет ленты подписок последними рецептами авторов, '
+            'на которых подписаны пользователи (например, после загрузки '
+            'подписок в обход API).')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users')
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.order_by('user_id')
+        if options.get('users') is not None:
+            follows = follows.filter(user_id__in=options['users'])
+        authors = {}
+        for user_id, author_id in follows.values_list(
+                'user_id', 'following_id').iterator():
+            authors.setdefault(user_id, []).append(author_id)
+
+        items = FeedItem.objects.all()
+        if options.get('users') is not None:
+            items = items.filter(user_id__in=options['users'])
+        with transaction.atomic():
+            items.delete()
+            for user_id, author_ids in authors.items():
+                FeedItem.objects.backfill(user_id, author_ids)
+        logger.debug(f'Ленты пересобраны для {len(authors)} пользователей.')
@@ -0,0 +1,30 @@
+import logging
+import sys
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+
+from recipes import search
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = ('Пересоздает поисковый индекс рецептов и поддерживающие его '
+            'триггеры. На SQLite триггеры теряются при пересоздании таблицы '
+            'рецептов миграциями, после таких миграций запустите команду.')
+
+    def handle(self, *args, **options):
+        using = router.db_for_write(Recipe)
+        with transaction.atomic(using=using):
+            search.install(connections[using])
+        logger.debug(f'Поисковый индекс пересоздан '
+                     f'({connections[using].vendor}).')
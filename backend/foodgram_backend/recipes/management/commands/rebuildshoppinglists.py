@@ -0,0 +1,71 @@
+import logging
+import sys
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+
+from recipes.models import ShoppingListItem
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = ('Пересобирает агрегированные списки покупок по корзинам '
+            'или проверяет их (--verify).')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--verify', action='store_true')
+        parser.add_argument('--user', type=int, action='append',
+                            dest='users')
+
+    def handle(self, *args, **options):
+        user_ids = options.get('users')
+        expected = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in
+            ShoppingListItem.objects.calculate(user_ids)}
+
+        if options.get('verify'):
+            self.verify(expected, user_ids)
+            return
+
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        with transaction.atomic():
+            items.delete()
+            ShoppingListItem.objects.bulk_create(
+                [ShoppingListItem(user_id=user_id, ingredient_id=key,
+                                  total=total)
+                 for (user_id, key), total in expected.items()],
+                batch_size=BATCH_SIZE)
+        logger.debug(f'Списки покупок пересобраны: {len(expected)} позиций.')
+
+    def verify(self, expected, user_ids):
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        actual = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in items.values_list(
+                'user_id', 'ingredient_id', 'total')}
+
+        mismatches = 0
+        for key in expected.keys() | actual.keys():
+            if expected.get(key) != actual.get(key):
+                mismatches += 1
+                logger.error(f'Пользователь {key[0]}, ингредиент {key[1]}: '
+                             f'ожидается {expected.get(key)}, '
+                             f'в таблице {actual.get(key)}')
+        if mismatches:
+            sys.exit(1)
+        logger.debug(f'Списки покупок согласованы: {len(expected)} позиций.')
@@ -0,0 +1,61 @@
+import logging
+import sys
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import router, transaction
+from django.db.models import F
+
+from recipes.models import (COUNTERS, Recipe, RecipeCounterShard,
+                            count_related, recount)
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+handler = logging.StreamHandler(sys.stdout)
+formatter = logging.Formatter(
+    '%(asctime)s [%(levelname)s] %(filename)s/%(funcName)s %(message)s'
+)
+logger.addHandler(handler)
+handler.setFormatter(formatter)
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает денормализованные счетчики (избранное, корзины, '
+            'рецепты и подписчики) или проверяет их (--verify).')
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument('--verify', action='store_true')
+
+    def handle(self, *args, **options):
+        if options.get('verify'):
+            self.fold()
+            self.verify()
+            return
+
+        # Перенос и пересчет в одной транзакции: шарды остаются
+        # заблокированными, пока счетчики не пересчитаны.
+        with transaction.atomic(using=router.db_for_write(Recipe)):
+            self.fold()
+            for source, fk, field in COUNTERS:
+                recount(source, fk, field)
+                logger.debug(f'Счетчик {field} пересчитан.')
+
+    def fold(self):
+        folded = RecipeCounterShard.objects.fold()
+        if folded:
+            logger.debug(f'Перенесено шардов счетчиков: {folded}.')
+
+    def verify(self):
+        mismatches = 0
+        for source, fk, field in COUNTERS:
+            model = source._meta.get_field(fk).related_model
+            wrong = model.objects.annotate(
+                expected=count_related(source, fk)
+            ).exclude(**{field: F('expected')}).values_list(
+                'pk', field, 'expected')
+            for pk, actual, expected in wrong:
+                mismatches += 1
+                logger.error(f'{model.__name__} {pk}, {field}: '
+                             f'ожидается {expected}, в таблице {actual}')
+        if mismatches:
+            sys.exit(1)
+        logger.debug('Счетчики согласованы.')
@@ -0,0 +1,79 @@
+# Generated by Django 3.2 on 2026-10-18 20:13
+
+import logging
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+logger = logging.getLogger(__name__)
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    """Сливает дубли, появившиеся от повторных запусков fillingredients."""
+
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientRecipe = apps.get_model('recipes', 'IngredientRecipe')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingListItem = apps.get_model('recipes', 'ShoppingListItem')
+
+    groups = Ingredient.objects.values('name', 'measurement_unit').annotate(
+        keep=Min('id'), count=Count('id')).filter(count__gt=1).order_by()
+    merged = False
+    for group in groups:
+        duplicates = Ingredient.objects.filter(
+            name=group['name'], measurement_unit=group['measurement_unit']
+        ).exclude(id=group['keep']).values_list('id', flat=True)
+        for duplicate in list(duplicates):
+            kept = IngredientRecipe.objects.filter(
+                ingredient_id=group['keep'])
+            recipes = kept.values('recipe_id')
+            amounts = dict(kept.values_list('recipe_id', 'amount'))
+            for recipe_id, amount in IngredientRecipe.objects.filter(
+                    ingredient_id=duplicate, recipe_id__in=recipes
+            ).values_list('recipe_id', 'amount'):
+                # Рецепт уже содержит оставляемый ингридиент: количества
+                # складываются. API такой рецепт отклонил бы, а миграция
+                # не может, поэтому сумма больше MAX_VALUE урезается до
+                # MAX_VALUE и попадает в лог.
+                total = amounts[recipe_id] + amount
+                if total > settings.MAX_VALUE:
+                    logger.warning(
+                        f'Рецепт {recipe_id}: количество ингридиента '
+                        f'"{group["name"]}" ({total}) урезано до '
+                        f'{settings.MAX_VALUE}.')
+                    total = settings.MAX_VALUE
+                kept.filter(recipe_id=recipe_id).update(amount=total)
+            IngredientRecipe.objects.filter(ingredient_id=duplicate).exclude(
+                recipe_id__in=recipes).update(ingredient_id=group['keep'])
+            Ingredient.objects.filter(id=duplicate).delete()
+        merged = True
+
+    if not merged:
+        return
+    ShoppingListItem.objects.all().delete()
+    totals = ShoppingCart.objects.values_list(
+        'user_id', 'recipe__ingredientrecipe__ingredient_id').annotate(
+            total=Sum('recipe__ingredientrecipe__amount')).filter(
+                total__isnull=False).order_by()
+    ShoppingListItem.objects.bulk_create(
+        [ShoppingListItem(user_id=user_id, ingredient_id=ingredient_id,
+                          total=total)
+         for user_id, ingredient_id, total in totals],
+        batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_name_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_ingredients,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_unit'),
+        ),
+    ]
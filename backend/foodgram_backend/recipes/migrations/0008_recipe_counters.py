@@ -0,0 +1,74 @@
+# Generated by Django 3.2 on 2026-10-18 20:37
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+import django.db.models.deletion
+
+COUNTERS = (
+    ('Favorite', 'recipe', 'favorites_count'),
+    ('ShoppingCart', 'recipe', 'in_carts_count'),
+    ('Recipe', 'author', 'recipes_count'),
+    ('Follow', 'following', 'followers_count'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    """Заполняет новые счетчики по существующим связям."""
+
+    for name, fk, field in COUNTERS:
+        source = apps.get_model('recipes', name)
+        model = source._meta.get_field(fk).related_model
+        model.objects.update(**{field: Coalesce(Subquery(
+            source.objects.filter(**{fk: OuterRef('pk')}).order_by().values(
+                fk).annotate(total=Count('pk')).values('total')), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_renditions'),
+        ('users', '0002_user_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeCounterShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=32, verbose_name='Счетчик')),
+                ('shard', models.PositiveSmallIntegerField(verbose_name='Шард')),
+                ('value', models.IntegerField(default=0, verbose_name='Значение')),
+            ],
+            options={
+                'verbose_name': 'Шард счетчика',
+                'verbose_name_plural': 'Шарды счетчиков',
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_carts_count',
+            field=models.IntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', '-id'], name='recipe_popularity_idx'),
+        ),
+        migrations.AddField(
+            model_name='recipecountershard',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipecountershard',
+            constraint=models.UniqueConstraint(fields=('recipe', 'field', 'shard'), name='unique_recipe_counter_shard'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
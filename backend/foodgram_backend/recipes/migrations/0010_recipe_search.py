@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from recipes import search
+
+
+def install(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_trending'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
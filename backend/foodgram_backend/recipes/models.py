@@ -1,10 +1,153 @@
+import random
+from collections import defaultdict
+from itertools import islice
+
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import connections, models, router, transaction
+from django.db.models import (BooleanField, Case, Count, Exists, F, OuterRef,
+                              Prefetch, Q, Subquery, Sum, Value, When, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
+from django.db.models.sql import InsertQuery
+
+from .signals import counter_shards_changed
 
 User = get_user_model()
 
+UPDATE_BATCH_SIZE = 500
+
+
+def insert_ignore(objs):
+    """Вставляет объекты через INSERT ... ON CONFLICT DO NOTHING и
+    возвращает число действительно вставленных строк. Повторная вставка
+    существующей строки не ошибка и не требует предварительного SELECT."""
+
+    objs = list(objs)
+    if not objs:
+        return 0
+    model = type(objs[0])
+    using = router.db_for_write(model)
+    connection = connections[using]
+    fields = [field for field in model._meta.concrete_fields
+              if not field.primary_key]
+    batch_size = max(connection.ops.bulk_batch_size(fields, objs), 1)
+    inserted = 0
+    with connection.cursor() as cursor:
+        for start in range(0, len(objs), batch_size):
+            query = InsertQuery(model, ignore_conflicts=True)
+            query.insert_values(fields, objs[start:start + batch_size])
+            for sql, params in query.get_compiler(using).as_sql():
+                cursor.execute(sql, params)
+                inserted += cursor.rowcount
+    return inserted
+
+
+def value_map(field, values, default=0):
+    """Выражение, подставляющее значение из словаря {ключ: значение}
+    по полю field: позволяет обновить много строк одним UPDATE."""
+
+    return Case(*[When(**{field: key}, then=Value(value))
+                  for key, value in values.items()], default=Value(default))
+
+
+def count_related(source, fk):
+    """Подзапрос с количеством строк source, ссылающихся на объект."""
+
+    return Coalesce(Subquery(
+        source.objects.filter(**{fk: OuterRef('pk')}).order_by().values(
+            fk).annotate(total=Count('pk')).values('total')), 0)
+
+
+def update_counter(source, fk, field, ids, delta):
+    """Атомарно (через F()) меняет счетчик field у объектов ids, на которые
+    ссылается поле fk модели source. При COUNTER_SHARDS > 1 счетчики
+    рецептов копятся в шардах, чтобы популярный рецепт не становился
+    общей блокировкой для всех пишущих."""
+
+    model = source._meta.get_field(fk).related_model
+    if model is Recipe and settings.COUNTER_SHARDS > 1:
+        RecipeCounterShard.objects.add(field, ids, delta)
+    else:
+        model.objects.filter(pk__in=ids).update(**{field: F(field) + delta})
+
+
+def recount(source, fk, field, ids=None):
+    """Пересчитывает счетчик field с нуля по строкам source.
+
+    Без ids пересчитываются все объекты. Накопленные в шардах значения
+    при этом сбрасываются. Шарды блокируются до подсчета, поэтому
+    параллельный перенос или увеличение не попадут в счетчик дважды.
+    """
+
+    model = source._meta.get_field(fk).related_model
+    targets = model.objects.all()
+    if ids is not None:
+        targets = targets.filter(pk__in=ids)
+    with transaction.atomic(using=router.db_for_write(model)):
+        if model is Recipe:
+            shards = RecipeCounterShard.objects.filter(
+                field=field, recipe__in=targets)
+            shard_ids = list(shards.select_for_update().values_list(
+                'id', flat=True))
+        targets.update(**{field: count_related(source, fk)})
+        if model is Recipe:
+            RecipeCounterShard.objects.filter(id__in=shard_ids).update(
+                value=0)
+
+
+class UserRelationQuerySet(models.QuerySet):
+    """Связи пользователя с рецептами или авторами: добавление и удаление
+    пачкой одним запросом, повторная операция не ошибка."""
+
+    target = 'recipe'
+    counter = None
+
+    def add(self, user_id, target_ids):
+        return self.change(user_id, target_ids, 1)
+
+    def remove(self, user_id, target_ids):
+        return self.change(user_id, target_ids, -1)
+
+    def change(self, user_id, target_ids, sign):
+        """Добавляет (sign=1) или удаляет (sign=-1) связи и возвращает
+        количество действительно измененных строк."""
+
+        target_ids = list(dict.fromkeys(target_ids))
+        target_id = f'{self.target}_id'
+        with transaction.atomic(using=self.db):
+            if len(target_ids) > 1:
+                # Для пачки заранее отбираем связи, которые изменятся,
+                # чтобы счетчики изменились только у них.
+                existing = set(self.filter(
+                    user_id=user_id, **{f'{target_id}__in': target_ids}
+                ).values_list(target_id, flat=True))
+                target_ids = [key for key in target_ids
+                              if (key in existing) == (sign < 0)]
+            if sign > 0:
+                changed = insert_ignore(
+                    self.model(user_id=user_id, **{target_id: key})
+                    for key in target_ids)
+            else:
+                # У связей нет зависимых объектов и сигналов, поэтому
+                # коллектор удаляет их одним DELETE без выборки.
+                changed, _ = self.filter(
+                    user_id=user_id, **{f'{target_id}__in': target_ids}
+                ).delete()
+            self.changed(user_id, target_ids, changed, sign)
+        return changed
+
+    def changed(self, user_id, target_ids, changed, sign):
+        if self.counter is None or not changed:
+            return
+        if changed == len(target_ids):
+            update_counter(
+                self.model, self.target, self.counter, target_ids, sign)
+        else:
+            # Часть связей изменил параллельный запрос.
+            recount(self.model, self.target, self.counter, target_ids)
+
 
 class MeasurementUnit(models.Model):
     """Модель единиц измерения."""
@@ -18,7 +161,7 @@ class MeasurementUnit(models.Model):
         ordering = ['id']
 
     def __str__(self):
-        return f'{self.id}: {self.slug} {self.name}'
+        return f'{self.id}: {self.unit_name}'
 
 
 class Ingredient(models.Model):
@@ -33,6 +176,12 @@ class Ingredient(models.Model):
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Ингридиенты'
         ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(
+                fields=('name', 'measurement_unit'),
+                name='unique_ingredient_unit'
+            )
+        ]
 
     def __str__(self):
         return f'{self.id}: {self.name}'
@@ -54,6 +203,72 @@ class Tag(models.Model):
         return f'{self.id}: {self.name} {self.slug}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Выборки рецептов для сериализатора чтения."""
+
+    def with_related(self):
+        """Подгружает автора, теги и ингредиенты фиксированным числом
+        запросов, независимо от количества рецептов."""
+
+        return self.prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredientrecipe_set',
+                queryset=IngredientRecipe.objects.select_related(
+                    'ingredient__measurement_unit')))
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами is_favorited, is_in_shopping_cart
+        и флагом is_subscribed у автора."""
+
+        if not user.is_authenticated:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_favorited=false, is_in_shopping_cart=false
+            ).prefetch_related(Prefetch(
+                'author', queryset=User.objects.annotate(is_subscribed=false)))
+
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        ).prefetch_related(Prefetch(
+            'author', queryset=User.objects.annotate(
+                is_subscribed=Exists(Follow.objects.filter(
+                    user=user, following=OuterRef('pk'))))))
+
+    def latest_per_author(self, author_ids, limit=None):
+        """Последние limit рецептов каждого автора одним запросом
+        (ROW_NUMBER() в разрезе автора)."""
+
+        queryset = self.filter(author_id__in=author_ids)
+        if limit is None:
+            return queryset
+        sql, params = queryset.annotate(recipe_rank=Window(
+            RowNumber(), partition_by=[F('author_id')],
+            order_by=F('id').desc())).order_by().values(
+                'id', 'recipe_rank').query.sql_with_params()
+        return self.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            f'WHERE ranked.recipe_rank <= %s', (*params, limit)))
+
+    def feed(self, user):
+        """Лента пользователя: рецепты из его таблицы ленты и рецепты
+        популярных авторов из подписок, чьи рецепты не рассылаются по
+        лентам при создании (см. FeedQuerySet.fan_out)."""
+
+        authors = list(User.objects.filter(
+            following__user=user,
+            followers_count__gte=settings.FEED_FANOUT_LIMIT,
+        ).values_list('id', flat=True))
+        if not authors:
+            return self.filter(feed_items__user=user)
+        return self.filter(
+            Q(id__in=FeedItem.objects.filter(user=user).values('recipe_id'))
+            | Q(author_id__in=authors))
+
+
 class Recipe(models.Model):
     """Модель рецептов."""
 
@@ -63,6 +278,9 @@ class Recipe(models.Model):
     name = models.CharField(verbose_name='Название', max_length=100)
     image = models.ImageField(
         verbose_name='Картинка', upload_to='recipes/images/')
+    renditions = models.JSONField(
+        verbose_name='Уменьшенные копии картинки', default=dict, blank=True,
+        editable=False)
     ingredients = models.ManyToManyField(
         Ingredient, through='IngredientRecipe', related_name='ingredient')
     tags = models.ManyToManyField(
@@ -74,10 +292,21 @@ class Recipe(models.Model):
             MinValueValidator(settings.MIN_VALUE),
             MaxValueValidator(settings.MAX_VALUE)])
 
+    favorites_count = models.IntegerField(
+        verbose_name='В избранном', default=0, editable=False)
+    in_carts_count = models.IntegerField(
+        verbose_name='В корзинах', default=0, editable=False)
+
+    objects = RecipeQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-id']
+        indexes = [
+            models.Index(fields=('-favorites_count', '-id'),
+                         name='recipe_popularity_idx'),
+        ]
 
     def __str__(self):
         return f'{self.id}: {self.name}'
@@ -99,9 +328,12 @@ class TagRecipe(models.Model):
                 name='unique_recipe_tag'
             )
         ]
+        indexes = [
+            models.Index(fields=('tag', 'recipe'), name='tag_recipe_idx'),
+        ]
 
     def __str__(self):
-        return f'{self.id}: {self.recipe.name} {self.tag.name}'
+        return f'{self.id}: {self.recipe_id} {self.tag_id}'
 
 
 class IngredientRecipe(models.Model):
@@ -130,7 +362,21 @@ class IngredientRecipe(models.Model):
         ]
 
     def __str__(self):
-        return f'{self.recipe.name} {self.ingredient.name} {self.amount}'
+        return f'{self.recipe_id}: {self.ingredient_id} {self.amount}'
+
+
+class FollowQuerySet(UserRelationQuerySet):
+    target = 'following'
+    counter = 'followers_count'
+
+    def changed(self, user_id, author_ids, changed, sign):
+        super().changed(user_id, author_ids, changed, sign)
+        if not changed:
+            return
+        if sign > 0:
+            FeedItem.objects.backfill(user_id, author_ids)
+        else:
+            FeedItem.objects.trim(user_id, author_ids)
 
 
 class Follow(models.Model):
@@ -143,6 +389,8 @@ class Follow(models.Model):
         User, on_delete=models.CASCADE, related_name='following',
         verbose_name='Автор')
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписчик'
         verbose_name_plural = 'Подписчики'
@@ -154,7 +402,11 @@ class Follow(models.Model):
         ordering = ['following__username']
 
     def __str__(self):
-        return f'{self.user.username} {self.following.username}'
+        return f'{self.user_id}: {self.following_id}'
+
+
+class FavoriteQuerySet(UserRelationQuerySet):
+    counter = 'favorites_count'
 
 
 class Favorite(models.Model):
@@ -166,6 +418,10 @@ class Favorite(models.Model):
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE, related_name='favorite',
         verbose_name='Рецепт')
+    created = models.DateTimeField(
+        verbose_name='Добавлен', auto_now_add=True, db_index=True)
+
+    objects = FavoriteQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Избранный рецепт'
@@ -178,7 +434,23 @@ class Favorite(models.Model):
         ]
 
     def __str__(self):
-        return f'{self.id}: {self.user.username} {self.recipe.name}'
+        return f'{self.id}: {self.user_id} {self.recipe_id}'
+
+
+class ShoppingCartQuerySet(UserRelationQuerySet):
+    """Корзина, изменения которой переносятся в список покупок."""
+
+    counter = 'in_carts_count'
+
+    def changed(self, user_id, recipe_ids, changed, sign):
+        super().changed(user_id, recipe_ids, changed, sign)
+        if not changed:
+            return
+        if len(recipe_ids) == 1:
+            ShoppingListItem.objects.add_recipe(
+                user_id, recipe_ids[0], sign)
+        else:
+            ShoppingListItem.objects.rebuild((user_id,))
 
 
 class ShoppingCart(models.Model):
@@ -192,6 +464,10 @@ class ShoppingCart(models.Model):
         Recipe, on_delete=models.CASCADE, related_name='shopping_cart',
         verbose_name='Рецепт'
     )
+    created = models.DateTimeField(
+        verbose_name='Добавлен', auto_now_add=True, db_index=True)
+
+    objects = ShoppingCartQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Корзина покупок'
@@ -204,5 +480,364 @@ class ShoppingCart(models.Model):
             )
         ]
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            if self.pk is not None:
+                ShoppingListItem.objects.remove_recipe(
+                    *ShoppingCart.objects.values_list(
+                        'user_id', 'recipe_id').get(pk=self.pk))
+            super().save(*args, **kwargs)
+            ShoppingListItem.objects.add_recipe(self.user_id, self.recipe_id)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            ShoppingListItem.objects.remove_recipe(
+                self.user_id, self.recipe_id)
+            return super().delete(*args, **kwargs)
+
+    def __str__(self):
+        return f'{self.id}: {self.user_id} {self.recipe_id}'
+
+
+class ShoppingListQuerySet(models.QuerySet):
+    """Поддержка агрегированного списка покупок в актуальном состоянии."""
+
+    def apply(self, user_ids, amounts):
+        """Прибавляет к суммам пользователей количества из словаря
+        {ingredient_id: amount}. Отрицательные значения вычитаются."""
+
+        user_ids = list(user_ids)
+        amounts = {key: value for key, value in amounts.items() if value}
+        if not user_ids or not amounts:
+            return
+        with transaction.atomic():
+            self.bulk_create(
+                [ShoppingListItem(user_id=user_id, ingredient_id=key, total=0)
+                 for user_id in user_ids for key in amounts],
+                ignore_conflicts=True)
+            self.filter(
+                user_id__in=user_ids, ingredient_id__in=amounts
+            ).update(total=F('total') + Case(
+                *[When(ingredient_id=key, then=Value(value))
+                  for key, value in amounts.items()],
+                default=Value(0)))
+            self.filter(user_id__in=user_ids, total__lte=0).delete()
+
+    def add_recipe(self, user_id, recipe_id, sign=1):
+        self.apply((user_id,), {
+            ingredient_id: sign * amount
+            for ingredient_id, amount in IngredientRecipe.objects.filter(
+                recipe_id=recipe_id).values_list('ingredient_id', 'amount')})
+
+    def remove_recipe(self, user_id, recipe_id):
+        self.add_recipe(user_id, recipe_id, sign=-1)
+
+    def update_recipe(self, recipe, old_amounts, new_amounts):
+        """Переносит изменение состава рецепта в корзины, где он лежит."""
+
+        delta = dict(new_amounts)
+        for ingredient_id, amount in old_amounts.items():
+            delta[ingredient_id] = delta.get(ingredient_id, 0) - amount
+        self.apply(ShoppingCart.objects.filter(
+            recipe=recipe).values_list('user_id', flat=True), delta)
+
+    def delete_recipe(self, recipe):
+        """Вычитает рецепт из всех корзин перед его удалением."""
+
+        amounts = dict(IngredientRecipe.objects.filter(
+            recipe=recipe).values_list('ingredient_id', 'amount'))
+        self.update_recipe(recipe, amounts, {})
+
+    def rebuild(self, user_ids):
+        """Пересчитывает списки покупок пользователей с нуля."""
+
+        with transaction.atomic(using=self.db):
+            self.filter(user_id__in=user_ids).delete()
+            self.bulk_create(
+                [ShoppingListItem(user_id=user_id, ingredient_id=key,
+                                  total=total)
+                 for user_id, key, total in self.calculate(user_ids)])
+
+    def calculate(self, user_ids=None):
+        """Считает список покупок с нуля по корзинам."""
+
+        queryset = ShoppingCart.objects.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        return queryset.values_list(
+            'user_id', 'recipe__ingredientrecipe__ingredient_id').annotate(
+                total=Sum('recipe__ingredientrecipe__amount')).filter(
+                    total__isnull=False).order_by()
+
+
+class ShoppingListItem(models.Model):
+    """Агрегированный список покупок пользователя."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='shopping_list',
+        verbose_name='Пользователь')
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, related_name='+',
+        verbose_name='Ингридиент')
+    total = models.IntegerField(verbose_name='Количество')
+
+    objects = ShoppingListQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Позиция списка покупок'
+        verbose_name_plural = 'Списки покупок'
+        ordering = ['id']
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_item'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.ingredient_id} {self.total}'
+
+
+class RecipeCounterShardQuerySet(models.QuerySet):
+
+    def add(self, field, recipe_ids, delta):
+        """Прибавляет delta к случайному шарду счетчика каждого рецепта."""
+
+        shard = random.randrange(settings.COUNTER_SHARDS)
+        shards = self.filter(field=field, shard=shard,
+                             recipe_id__in=recipe_ids)
+        with transaction.atomic(using=self.db):
+            if len(recipe_ids) > 1 or not shards.update(
+                    value=F('value') + delta):
+                insert_ignore(
+                    RecipeCounterShard(recipe_id=recipe_id, field=field,
+                                       shard=shard)
+                    for recipe_id in recipe_ids)
+                shards.update(value=F('value') + delta)
+        counter_shards_changed.send(sender=RecipeCounterShard)
+
+    def fold(self, batch_size=UPDATE_BATCH_SIZE):
+        """Переносит значения шардов в счетчики рецептов.
+
+        Шарды не удаляются, а уменьшаются на перенесенное значение, поэтому
+        увеличения, сделанные во время переноса, не теряются. Пачка
+        читается с блокировкой строк: параллельный перенос или recount
+        ждет ее завершения.
+        """
+
+        folded = last_id = 0
+        while True:
+            with transaction.atomic(using=self.db):
+                rows = list(self.select_for_update().filter(
+                    id__gt=last_id).exclude(value=0).order_by(
+                        'id').values_list('id', 'recipe_id', 'field',
+                                          'value')[:batch_size])
+                if not rows:
+                    return folded
+                totals = defaultdict(dict)
+                for _, recipe_id, field, value in rows:
+                    totals[field][recipe_id] = (
+                        totals[field].get(recipe_id, 0) + value)
+                for field, deltas in totals.items():
+                    Recipe.objects.filter(pk__in=deltas).update(
+                        **{field: F(field) + value_map('pk', deltas)})
+                self.filter(id__in=[row[0] for row in rows]).update(
+                    value=F('value') - value_map(
+                        'id', {row[0]: row[3] for row in rows}))
+            folded += len(rows)
+            last_id = rows[-1][0]
+
+
+class RecipeCounterShard(models.Model):
+    """Часть счетчика рецепта (settings.COUNTER_SHARDS > 1).
+
+    Увеличения распределяются по нескольким строкам, а задача
+    fold_counters периодически переносит их сумму в поле рецепта.
+    """
+
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='+',
+        verbose_name='Рецепт')
+    field = models.CharField(verbose_name='Счетчик', max_length=32)
+    shard = models.PositiveSmallIntegerField(verbose_name='Шард')
+    value = models.IntegerField(verbose_name='Значение', default=0)
+
+    objects = RecipeCounterShardQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Шард счетчика'
+        verbose_name_plural = 'Шарды счетчиков'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'field', 'shard'),
+                name='unique_recipe_counter_shard'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.field}[{self.shard}] {self.value}'
+
+
+COUNTERS = (
+    (Favorite, 'recipe', 'favorites_count'),
+    (ShoppingCart, 'recipe', 'in_carts_count'),
+    (Recipe, 'author', 'recipes_count'),
+    (Follow, 'following', 'followers_count'),
+)
+"""Денормализованные счетчики: (модель связи, поле-ссылка, счетчик)."""
+
+
+class TrendingQuerySet(models.QuerySet):
+
+    def add_scores(self, scores):
+        """Прибавляет к рейтингу рецептов значения из словаря
+        {recipe_id: score} одним INSERT и одним UPDATE на пачку."""
+
+        scores = list(scores.items())
+        for start in range(0, len(scores), UPDATE_BATCH_SIZE):
+            batch = dict(scores[start:start + UPDATE_BATCH_SIZE])
+            with transaction.atomic(using=self.db):
+                self.bulk_create(
+                    [TrendingRecipe(recipe_id=recipe_id, score=0)
+                     for recipe_id in batch], ignore_conflicts=True)
+                self.filter(recipe_id__in=batch).update(
+                    score=F('score') + value_map(
+                        'recipe_id', batch, default=0.0))
+
+
+class TrendingRecipe(models.Model):
+    """Предрасчитанный рейтинг популярности рецепта за последнее время.
+
+    Оценка хранится приведенной к моменту TrendingState.epoch, поэтому
+    затухание одинаково для всех рецептов и не требует обновлять строки,
+    в которых не было новых событий.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, primary_key=True,
+        related_name='trending', verbose_name='Рецепт')
+    score = models.FloatField(verbose_name='Рейтинг')
+
+    objects = TrendingQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинг рецептов'
+        indexes = [
+            models.Index(fields=('-score',), name='trending_score_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.score}'
+
+
+class TrendingState(models.Model):
+    """Состояние расчета рейтинга: момент, к которому приведены оценки,
+    и время последнего учтенного события."""
+
+    epoch = models.DateTimeField(verbose_name='Момент приведения')
+    until = models.DateTimeField(verbose_name='Учтены события до')
+
+    class Meta:
+        verbose_name = 'Состояние рейтинга'
+        verbose_name_plural = 'Состояние рейтинга'
+
+
+class FeedQuerySet(models.QuerySet):
+    """Ленты подписок, заполняемые при создании рецепта."""
+
+    def fan_out(self, recipe):
+        """Добавляет рецепт в ленты подписчиков автора.
+
+        Рецепты авторов, у которых не меньше FEED_FANOUT_LIMIT подписчиков,
+        не рассылаются: такие авторы подмешиваются в ленту при чтении.
+        Возвращает число подписчиков, которым рецепт отправлен; строки,
+        уже бывшие в ленте, пропускаются базой и тоже входят в это число.
+        """
+
+        if User.objects.filter(
+                id=recipe.author_id,
+                followers_count__gte=settings.FEED_FANOUT_LIMIT).exists():
+            return 0
+        followers = Follow.objects.filter(
+            following_id=recipe.author_id).values_list(
+                'user_id', flat=True).iterator()
+        attempted = 0
+        while True:
+            batch = list(islice(followers, settings.FEED_BATCH_SIZE))
+            if not batch:
+                return attempted
+            self.bulk_create(
+                [FeedItem(user_id=user_id, recipe_id=recipe.id,
+                          author_id=recipe.author_id) for user_id in batch],
+                ignore_conflicts=True)
+            attempted += len(batch)
+
+    def backfill(self, user_id, author_ids):
+        """Добавляет в ленту последние рецепты новых подписок."""
+
+        recipes = Recipe.objects.latest_per_author(
+            author_ids, settings.FEED_BACKFILL).filter(
+                author__followers_count__lt=settings.FEED_FANOUT_LIMIT)
+        self.bulk_create(
+            [FeedItem(user_id=user_id, recipe_id=recipe_id,
+                      author_id=author_id)
+             for recipe_id, author_id in recipes.values_list(
+                 'id', 'author_id')],
+            ignore_conflicts=True)
+
+    def trim(self, user_id, author_ids):
+        """Убирает из ленты рецепты авторов, от которых пользователь
+        отписался."""
+
+        self.filter(user_id=user_id, author_id__in=author_ids).delete()
+
+
+class FeedItem(models.Model):
+    """Рецепт в ленте подписок пользователя."""
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='feed',
+        verbose_name='Пользователь')
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name='feed_items',
+        verbose_name='Рецепт')
+    author = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name='+',
+        verbose_name='Автор')
+
+    objects = FeedQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Рецепт в ленте'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_item'
+            )
+        ]
+        indexes = [
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.recipe_id}'
+
+
+class ReferenceVersion(models.Model):
+    """Время последнего изменения справочника. Хранится в базе, поэтому
+    одинаково для всех процессов: по нему сверяются кэши ответов
+    справочников и из него берется Last-Modified."""
+
+    dataset = models.CharField(
+        verbose_name='Справочник', max_length=32, primary_key=True)
+    changed = models.DateTimeField(verbose_name='Изменен')
+
+    class Meta:
+        verbose_name = 'Версия справочника'
+        verbose_name_plural = 'Версии справочников'
+
     def __str__(self):
-        return f'{self.id}: {self.user}: {self.recipe}'
+        return f'{self.dataset}: {self.changed}'
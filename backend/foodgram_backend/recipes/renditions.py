@@ -0,0 +1,89 @@
+"""Уменьшенные копии картинок рецептов.
+
+Для каждого размера из settings.IMAGE_RENDITIONS один раз создаются копии
+в WebP и JPEG рядом с исходной картинкой. Их имена сохраняются
+в Recipe.renditions вместе с именем исходной картинки, поэтому при отдаче
+рецептов не нужно обращаться ни к хранилищу, ни к key-value хранилищу
+sorl.thumbnail.
+"""
+
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from sorl.thumbnail import default
+from sorl.thumbnail.base import EXTENSIONS, ThumbnailBackend
+from sorl.thumbnail.images import ImageFile
+
+from .models import Recipe
+
+FORMATS = {
+    'jpeg': 'JPEG',
+    'webp': 'WEBP',
+}
+
+
+class RenditionBackend(ThumbnailBackend):
+    """Создает копии движком sorl.thumbnail без записи в его key-value
+    хранилище: исходная картинка читается один раз на все размеры."""
+
+    def get_name(self, source, size, image_format):
+        directory, filename = os.path.split(source.name)
+        stem = os.path.splitext(filename)[0]
+        return os.path.join(directory, 'renditions',
+                            f'{stem}_{size}.{EXTENSIONS[image_format]}')
+
+    def render(self, source, source_image, size, image_format):
+        options = dict(self.default_options, format=image_format,
+                       quality=settings.IMAGE_RENDITION_QUALITY,
+                       upscale=False)
+        thumbnail = ImageFile(self.get_name(source, size, image_format),
+                              default.storage)
+        self._create_thumbnail(source_image, settings.IMAGE_RENDITIONS[size],
+                               options, thumbnail)
+        return thumbnail.name
+
+
+backend = RenditionBackend()
+
+
+def make_renditions(recipe):
+    """Создает копии картинки рецепта, сохраняет их имена в базе
+    и удаляет копии прежней картинки."""
+
+    source = ImageFile(recipe.image)
+    source_image = default.engine.get_image(source)
+    try:
+        renditions = {'source': recipe.image.name}
+        for size in settings.IMAGE_RENDITIONS:
+            renditions[size] = {
+                key: backend.render(source, source_image, size, image_format)
+                for key, image_format in FORMATS.items()}
+    finally:
+        default.engine.cleanup(source_image)
+
+    delete_renditions(recipe.renditions)
+    recipe.renditions = renditions
+    Recipe.objects.filter(pk=recipe.pk).update(renditions=renditions)
+    return renditions
+
+
+def delete_renditions(renditions):
+    for size, names in (renditions or {}).items():
+        if size != 'source':
+            for name in names.values():
+                default_storage.delete(name)
+
+
+def get_rendition_url(recipe, size, key='jpeg'):
+    """URL копии картинки нужного размера.
+
+    Если копии еще не созданы или устарели, возвращается исходная картинка.
+    """
+
+    renditions = recipe.renditions or {}
+    if renditions.get('source') != recipe.image.name or size not in (
+            renditions):
+        return recipe.image.url if recipe.image else None
+    return default_storage.url(renditions[size][key])
@@ -0,0 +1,139 @@
+"""Полнотекстовый поиск рецептов по названию и описанию.
+
+На PostgreSQL в таблице рецептов хранится столбец search_vector (tsvector
+с русской морфологией, название весит больше описания), который заполняет
+триггер, и GIN-индекс по нему. На SQLite для локальной разработки
+используется внешняя таблица FTS5, синхронизируемая триггерами; вместо
+морфологии у слов отбрасываются окончания и ищется префикс. Столбец и
+таблица не описаны в моделях, поэтому ORM их не читает и не перезаписывает.
+"""
+
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+TABLE = 'recipes_recipe'
+FTS_TABLE = 'recipes_recipe_fts'
+WORD = re.compile(r'\w+')
+ENDINGS = 'аеёиоуыьэюяй'
+MIN_STEM = 4
+
+VECTOR = (
+    "setweight(to_tsvector('russian', coalesce({row}name, '')), 'A') || "
+    "setweight(to_tsvector('russian', coalesce({row}text, '')), 'B')")
+
+POSTGRESQL_INSTALL = (
+    f'ALTER TABLE {TABLE} ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    f'CREATE OR REPLACE FUNCTION {TABLE}_search_vector() '
+    f'''RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {VECTOR.format(row='NEW.')};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql''',
+    f'DROP TRIGGER IF EXISTS {TABLE}_search_vector ON {TABLE}',
+    f'''CREATE TRIGGER {TABLE}_search_vector
+    BEFORE INSERT OR UPDATE OF name, text ON {TABLE}
+    FOR EACH ROW EXECUTE PROCEDURE {TABLE}_search_vector()''',
+    f'UPDATE {TABLE} SET search_vector = {VECTOR.format(row="")}',
+    f'CREATE INDEX IF NOT EXISTS recipe_search_idx ON {TABLE} '
+    f'USING gin (search_vector)',
+)
+POSTGRESQL_UNINSTALL = (
+    f'DROP TRIGGER IF EXISTS {TABLE}_search_vector ON {TABLE}',
+    f'DROP FUNCTION IF EXISTS {TABLE}_search_vector()',
+    f'ALTER TABLE {TABLE} DROP COLUMN IF EXISTS search_vector',
+)
+
+SQLITE_UNINSTALL = (
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_insert',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_delete',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+)
+SQLITE_INSTALL = SQLITE_UNINSTALL + (
+    f'''CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+    name, text, content='{TABLE}', content_rowid='id')''',
+    f'''CREATE TRIGGER {FTS_TABLE}_insert AFTER INSERT ON {TABLE} BEGIN
+    INSERT INTO {FTS_TABLE}(rowid, name, text)
+    VALUES (new.id, new.name, new.text);
+END''',
+    f'''CREATE TRIGGER {FTS_TABLE}_delete AFTER DELETE ON {TABLE} BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+    VALUES ('delete', old.id, old.name, old.text);
+END''',
+    f'''CREATE TRIGGER {FTS_TABLE}_update
+    AFTER UPDATE OF name, text ON {TABLE} BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, text)
+    VALUES ('delete', old.id, old.name, old.text);
+    INSERT INTO {FTS_TABLE}(rowid, name, text)
+    VALUES (new.id, new.name, new.text);
+END''',
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+)
+
+INSTALL = {'postgresql': POSTGRESQL_INSTALL, 'sqlite': SQLITE_INSTALL}
+UNINSTALL = {'postgresql': POSTGRESQL_UNINSTALL, 'sqlite': SQLITE_UNINSTALL}
+
+
+def execute(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def install(connection):
+    """Создает (или пересоздает) поисковый индекс и триггеры и заполняет
+    индекс по существующим рецептам. На других СУБД ничего не делает."""
+
+    execute(connection, INSTALL.get(connection.vendor, ()))
+
+
+def uninstall(connection):
+    execute(connection, UNINSTALL.get(connection.vendor, ()))
+
+
+def fts_query(query):
+    """Запрос FTS5: все слова запроса как префиксы без окончаний."""
+
+    terms = []
+    for word in WORD.findall(query.lower()):
+        stem = word
+        while len(stem) > MIN_STEM and stem[-1] in ENDINGS:
+            stem = stem[:-1]
+        terms.append(f'"{stem}"*')
+    return ' '.join(terms)
+
+
+def search_recipes(queryset, query):
+    """Оставляет рецепты, подходящие под запрос, и сортирует их по
+    релевантности (аннотация search_rank, больше - лучше)."""
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite':
+        match = fts_query(query)
+        if not match:
+            return queryset.none()
+        # bm25() доступна только в запросе к самой таблице FTS5, поэтому
+        # она присоединяется к выборке, а не вызывается в подзапросе.
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f'{FTS_TABLE}.rowid = {TABLE}.id',
+                   f'{FTS_TABLE} MATCH %s'],
+            params=[match],
+            select={'search_rank': f'-bm25({FTS_TABLE}, 10.0, 1.0)'},
+        ).order_by('-search_rank', '-id')
+
+    if vendor == 'postgresql':
+        tsquery = "plainto_tsquery('russian', %s)"
+        matches = RawSQL(f'{TABLE}.search_vector @@ {tsquery}', (query,),
+                         output_field=BooleanField())
+        rank = RawSQL(f'ts_rank({TABLE}.search_vector, {tsquery})',
+                      (query,), output_field=FloatField())
+    else:
+        matches = Q(name__icontains=query) | Q(text__icontains=query)
+        rank = Value(0.0, output_field=FloatField())
+    return queryset.filter(matches).annotate(search_rank=rank).order_by(
+        '-search_rank', '-id')
@@ -0,0 +1,15 @@
+"""Обработчики сигналов, поддерживающие списки покупок.
+
+Корзина и правка рецепта через API меняют списки сами (см.
+ShoppingCartQuerySet и RecipeWriteSerializer). Здесь обрабатывается
+удаление рецепта любым путем: через API, в админке или каскадом вместе
+с автором.
+"""
+
+from .models import ShoppingListItem
+
+
+def recipe_deleting(sender, instance, **kwargs):
+    """Вычитает рецепт из корзин, пока его ингридиенты еще в базе."""
+
+    ShoppingListItem.objects.delete_recipe(instance)
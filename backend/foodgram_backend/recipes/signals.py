@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+reference_data_changed = Signal()
+"""Справочник изменен в обход сигналов моделей (например, bulk_create).
+Отправителем передается модель справочника."""
+
+counter_shards_changed = Signal()
+"""В шарды счетчиков рецептов записаны новые значения."""
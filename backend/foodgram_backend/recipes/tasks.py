@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from jobs.queue import task
+
+from . import renditions
+from .models import FeedItem, Recipe, RecipeCounterShard
+
+FOLD_CACHE_KEY = 'recipes:fold_counters'
+
+
+@task
+def make_renditions(recipe_id):
+    """Создает уменьшенные копии картинки рецепта."""
+
+    recipe = Recipe.objects.filter(id=recipe_id).only(
+        'id', 'image', 'renditions').first()
+    if recipe is not None and recipe.image:
+        renditions.make_renditions(recipe)
+
+
+@task
+def delete_files(names):
+    """Удаляет файлы удаленного рецепта из хранилища."""
+
+    for name in names:
+        default_storage.delete(name)
+
+
+@task
+def fan_out_recipe(recipe_id):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+
+    recipe = Recipe.objects.filter(id=recipe_id).only(
+        'id', 'author_id').first()
+    if recipe is not None:
+        FeedItem.objects.fan_out(recipe)
+
+
+def recipe_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fan_out_recipe.enqueue(recipe_id=instance.id)
+
+
+def delete_recipe_files(sender, instance, **kwargs):
+    names = [name for size, files in instance.renditions.items()
+             if size != 'source' for name in files.values()]
+    if instance.image:
+        names.append(instance.image.name)
+    if names:
+        delete_files.enqueue(names=names)
+
+
+@task
+def fold_counters():
+    """Переносит значения шардов в счетчики рецептов."""
+
+    RecipeCounterShard.objects.fold()
+
+
+def schedule_fold(sender, **kwargs):
+    """Ставит перенос шардов в очередь не чаще раза в интервал."""
+
+    if cache.add(FOLD_CACHE_KEY, True, settings.COUNTER_FOLD_INTERVAL):
+        fold_counters.enqueue(delay=settings.COUNTER_FOLD_INTERVAL)
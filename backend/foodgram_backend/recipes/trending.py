@@ -0,0 +1,86 @@
+"""Рейтинг рецептов, популярных в последнее время.
+
+Каждое добавление в избранное или корзину дает рецепту вклад, который
+уменьшается вдвое за settings.TRENDING_HALF_LIFE. Оценки хранятся
+приведенными к моменту epoch: вклад события в момент t равен
+weight * exp(rate * (t - epoch)). Затухание одинаково для всех рецептов,
+поэтому порядок со временем не меняется и при очередном запуске достаточно
+прибавить вклады новых событий. Когда множитель становится большим,
+оценки приводятся к текущему моменту, а незначимые удаляются.
+"""
+
+import math
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Favorite, ShoppingCart, TrendingRecipe, TrendingState
+
+EVENTS = (
+    (Favorite, 1.0),
+    (ShoppingCart, 1.0),
+)
+COMMIT_LAG = timedelta(seconds=30)
+REBASE_AFTER = 10
+MIN_SCORE = 0.01
+
+
+def decay_rate():
+    return math.log(2) / settings.TRENDING_HALF_LIFE
+
+
+def collect(since, until, epoch):
+    """Вклады событий из интервала (since, until] по рецептам."""
+
+    rate = decay_rate()
+    scores = defaultdict(float)
+    for model, weight in EVENTS:
+        events = model.objects.filter(
+            created__gt=since, created__lte=until).order_by().values_list(
+                'recipe_id', 'created')
+        for recipe_id, created in events.iterator():
+            scores[recipe_id] += weight * math.exp(
+                rate * (created - epoch).total_seconds())
+    return scores
+
+
+def rebase(state, now):
+    """Приводит оценки к моменту now и удаляет незначимые."""
+
+    factor = math.exp(-decay_rate() * (now - state.epoch).total_seconds())
+    TrendingRecipe.objects.update(score=F('score') * factor)
+    TrendingRecipe.objects.filter(score__lt=MIN_SCORE).delete()
+    state.epoch = now
+
+
+@transaction.atomic
+def update_trending(now=None, rebuild=False):
+    """Учитывает события, появившиеся с прошлого запуска, и возвращает
+    количество рецептов, у которых изменилась оценка.
+
+    События учитываются с задержкой COMMIT_LAG, чтобы не пропустить строки
+    из транзакций, которые еще не завершились.
+    """
+
+    now = now or timezone.now()
+    until = now - COMMIT_LAG
+    state = TrendingState.objects.select_for_update().filter(pk=1).first()
+    if state is None or rebuild:
+        TrendingRecipe.objects.all().delete()
+        state = TrendingState(pk=1, epoch=now, until=now - timedelta(
+            seconds=settings.TRENDING_WINDOW))
+    elif (now - state.epoch).total_seconds() > (
+            REBASE_AFTER * settings.TRENDING_HALF_LIFE):
+        rebase(state, now)
+    if until <= state.until:
+        return 0
+
+    scores = collect(state.until, until, state.epoch)
+    TrendingRecipe.objects.add_scores(scores)
+    state.until = until
+    state.save()
+    return len(scores)
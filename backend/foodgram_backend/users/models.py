@@ -7,6 +7,10 @@ class User(AbstractUser):
     """Кастомная модель пользователя."""
     password = models.CharField(
         _('password'), max_length=150)
+    recipes_count = models.IntegerField(
+        verbose_name='Рецептов', default=0, editable=False)
+    followers_count = models.IntegerField(
+        verbose_name='Подписчиков', default=0, editable=False)
 
     class Meta:
         verbose_name = 'Пользователь'